@@ -18,6 +18,54 @@ POLLY_VOICE_ID = os.getenv("POLLY_VOICE_ID", "Zhiyu")  # 中文女声
 # 帧采样配置
 FRAME_SAMPLE_INTERVAL = int(os.getenv("FRAME_SAMPLE_INTERVAL", "30"))  # 采样间隔（秒）
 MAX_FRAMES_PER_VIDEO = int(os.getenv("MAX_FRAMES_PER_VIDEO", "3"))  # 每视频最大帧数
+FRAME_SEEK_MODE = os.getenv("FRAME_SEEK_MODE", "seek")  # 采样解码方式: seek(跳转)/grab(跳过不解码)/linear(逐帧解码)
+SMART_ANALYSIS_WIDTH = int(os.getenv("SMART_ANALYSIS_WIDTH", "320"))  # smart 模式场景/运动评分用的代理图宽度（0 为原始分辨率）
+SMART_ENGINE = os.getenv("SMART_ENGINE", "opencv")  # smart 模式候选检测引擎: opencv/ffmpeg
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "8"))  # YOLO 批量推理的帧数
+DETECT_PIPELINE = os.getenv("DETECT_PIPELINE", "true").lower() == "true"  # 解码与检测并行（流水线）
+DETECT_QUEUE_SIZE = int(os.getenv("DETECT_QUEUE_SIZE", "16"))  # 流水线中排队等待检测的最大帧数
+DETECT_DECODE_WORKERS = int(os.getenv("DETECT_DECODE_WORKERS", "4"))  # batch_detect 并行解码图片的线程数
+KEYFRAME_SCAN_WIDTH = int(os.getenv("KEYFRAME_SCAN_WIDTH", "640"))  # keyframes 模式解码 I 帧的缩放宽度
+DETECTION_INDEX_PATH = os.getenv("DETECTION_INDEX_PATH", "cache/detection_index.sqlite")  # 检测索引（留空则不缓存）
+BIRD_REFINE = os.getenv("BIRD_REFINE", "false").lower() == "true"  # 粗扫命中后在附近细扫选最清晰的一帧
+DETECT_BUDGET = int(os.getenv("DETECT_BUDGET", "0"))  # 每个视频最多推理次数（0 为不限）
+DETECT_TARGET_CONFIDENCE = float(os.getenv("DETECT_TARGET_CONFIDENCE", "0"))  # 达到该置信度即可提前结束（0 为不启用）
+DETECT_DAEMON_DIR = os.path.join(os.getenv("XDG_RUNTIME_DIR") or os.path.expanduser("~/.cache"), "bird-vlog")  # 守护进程的用户私有目录
+DETECT_DAEMON_SOCKET = os.getenv("DETECT_DAEMON_SOCKET", os.path.join(DETECT_DAEMON_DIR, "detector.sock"))  # 检测守护进程 socket（留空则不使用）
+DETECT_DAEMON_AUTHKEY_FILE = os.getenv("DETECT_DAEMON_AUTHKEY_FILE", os.path.join(DETECT_DAEMON_DIR, "detector.key"))  # 守护进程随机口令文件（0600）
+DETECT_BACKEND = os.getenv("DETECT_BACKEND", "ultralytics")  # 检测后端: ultralytics/onnx
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "models/yolov8n.onnx")  # ONNX 模型路径
+ONNX_INT8 = os.getenv("ONNX_INT8", "false").lower() == "true"  # 使用 INT8 量化模型
+MOTION_GATE = os.getenv("MOTION_GATE", "off")  # 运动门控: off/diff/mog2（画面没变化时跳过 YOLO）
+MOTION_GATE_THRESHOLD = float(os.getenv("MOTION_GATE_THRESHOLD", "0.005"))  # 变化像素占比达到该值才重新检测
+MOTION_GATE_MAX_SKIP = int(os.getenv("MOTION_GATE_MAX_SKIP", "12"))  # 最多连续跳过的采样帧数
+DETECT_TILE_MODE = os.getenv("DETECT_TILE_MODE", "off")  # 切片检测小鸟: off/motion（只切运动区域）/full（整帧切片）
+DETECT_TILE_SIZE = int(os.getenv("DETECT_TILE_SIZE", "640"))  # 切片边长（像素，原图分辨率）
+DETECT_POOL_SIZE = int(os.getenv("DETECT_POOL_SIZE", "1"))  # 检测模型实例数（并行处理多个视频时的并发推理数，0 为按 CPU 核数）
+DETECT_TORCH_THREADS = int(os.getenv("DETECT_TORCH_THREADS", "0"))  # 每个模型实例的 torch 线程数（0 为 CPU 核数 / 实例数）
+YOLO_WEIGHTS_DIR = os.getenv("YOLO_WEIGHTS_DIR", "models")  # YOLO 权重及融合模型缓存目录
+YOLO_WEIGHTS_SHA256 = os.getenv("YOLO_WEIGHTS_SHA256", "f59b3d833e2ff32e194b5bb8e08d211dc7c5bdf144b90d2c8412c47ccfc83b36")  # 官方 yolov8n.pt 的 SHA-256，下载和加载时都校验（设为空则跳过校验）
+YOLO_OFFLINE = os.getenv("YOLO_OFFLINE", "false").lower() == "true"  # 离线模式：本地没有权重时报错而不是下载
+
+# AI 分析配置
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "cache/analysis_cache.sqlite")  # 视觉分析缓存（留空则不缓存）
+ANALYSIS_CACHE_MAX_MB = float(os.getenv("ANALYSIS_CACHE_MAX_MB", "64"))  # 分析缓存容量上限（MB），超出按 LRU 淘汰
+ANALYSIS_DEDUPE = os.getenv("ANALYSIS_DEDUPE", "true").lower() == "true"  # 分析前按感知哈希合并几乎相同的帧
+ANALYSIS_DEDUPE_DISTANCE = int(os.getenv("ANALYSIS_DEDUPE_DISTANCE", "4"))  # dHash 汉明距离不超过该值视为相同（0-64）
+ANALYSIS_FRAMES_PER_REQUEST = int(os.getenv("ANALYSIS_FRAMES_PER_REQUEST", "1"))  # 每次请求打包分析的帧数（1 为逐帧请求）
+ANALYSIS_MAX_OUTPUT_TOKENS = int(os.getenv("ANALYSIS_MAX_OUTPUT_TOKENS", "4096"))  # 视觉模型单次回复的 token 上限（限制每次请求的帧数）
+ANALYSIS_TRIAGE = os.getenv("ANALYSIS_TRIAGE", "false").lower() == "true"  # 先用网格联系表粗筛，只有高分帧再逐帧分析
+TRIAGE_GRID = int(os.getenv("TRIAGE_GRID", "3"))  # 联系表每行/列的格数（3 即 3x3）
+TRIAGE_TILE_WIDTH = int(os.getenv("TRIAGE_TILE_WIDTH", "320"))  # 联系表每格宽度（像素）
+TRIAGE_MIN_SCORE = int(os.getenv("TRIAGE_MIN_SCORE", "4"))  # 粗筛得分达到该值才逐帧精细分析
+ANALYSIS_MAX_SIDE = int(os.getenv("ANALYSIS_MAX_SIDE", "1536"))  # 上传前把长边缩到该值（0 为不缩放）
+ANALYSIS_IMAGE_FORMAT = os.getenv("ANALYSIS_IMAGE_FORMAT", "jpeg")  # 上传格式: jpeg/webp/original（原文件不重新编码）
+ANALYSIS_IMAGE_QUALITY = int(os.getenv("ANALYSIS_IMAGE_QUALITY", "85"))  # 上传重新编码的质量（1-100）
+ANALYSIS_IMAGE_DETAIL = os.getenv("ANALYSIS_IMAGE_DETAIL", "auto")  # 视觉模型的 detail 参数: auto/low/high
+ANALYSIS_ROI_CROP = os.getenv("ANALYSIS_ROI_CROP", "false").lower() == "true"  # 有鸟框的帧只上传鸟所在区域的裁剪
+ANALYSIS_ROI_PADDING = float(os.getenv("ANALYSIS_ROI_PADDING", "0.5"))  # 裁剪时每边外扩鸟框宽高的比例
+ANALYSIS_ROI_MIN_SIDE = int(os.getenv("ANALYSIS_ROI_MIN_SIDE", "384"))  # 裁剪区域的最小边长（像素，保留周围环境）
+ANALYSIS_ROI_THUMBNAIL = int(os.getenv("ANALYSIS_ROI_THUMBNAIL", "512"))  # 裁剪时附带的全景缩略图长边（0 为不附带）
 
 # 输出配置
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
@@ -0,0 +1,91 @@
+"""AI 分析缓存模块 - 按图片内容 + 提示词 + 模型参数缓存视觉分析结果（SQLite，按容量 LRU 淘汰）"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_MAX_MB
+
+# 本进程内的缓存命中统计
+stats = {"hits": 0, "misses": 0}
+
+# batch_analyze 多线程写入时串行化（淘汰需要读写一致）
+_write_lock = threading.Lock()
+
+
+def make_key(image_bytes: bytes, prompt: str, model: str, params: dict) -> str:
+    """缓存键：图片字节 + 提示词 + 模型 + 请求参数，任一变化都会得到新的键"""
+    h = hashlib.sha256(image_bytes)
+    h.update(prompt.encode("utf-8"))
+    h.update(model.encode("utf-8"))
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _connect(cache_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(cache_path, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analyses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS analyses_lru ON analyses (last_used)")
+    return conn
+
+
+def load(key: str, cache_path: str = ANALYSIS_CACHE_PATH, counter: dict = stats) -> str:
+    """读取缓存的模型原始回复（并刷新最近使用时间），未命中返回 None
+    
+    命中/未命中计入 counter（默认为本模块的 stats，其它用途的缓存项可以另记）。
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        counter["misses"] += 1
+        return None
+    
+    conn = _connect(cache_path)
+    try:
+        row = conn.execute("SELECT response FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            with conn:
+                conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+    finally:
+        conn.close()
+    
+    counter["hits" if row is not None else "misses"] += 1
+    return row[0] if row is not None else None
+
+
+def store(key: str, response: str, cache_path: str = ANALYSIS_CACHE_PATH, max_mb: float = ANALYSIS_CACHE_MAX_MB):
+    """保存模型回复；总大小超过 max_mb 时按最近使用时间从旧到新淘汰"""
+    if not cache_path:
+        return
+    
+    size = len(response.encode("utf-8"))
+    max_bytes = int(max_mb * (1 << 20))
+    with _write_lock:
+        conn = _connect(cache_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, response, size, time.time())
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+                if total > max_bytes:
+                    evict = []
+                    for old_key, old_size in conn.execute("SELECT key, size FROM analyses ORDER BY last_used"):
+                        if total <= max_bytes:
+                            break
+                        evict.append((old_key,))
+                        total -= old_size
+                    conn.executemany("DELETE FROM analyses WHERE key = ?", evict)
+        finally:
+            conn.close()
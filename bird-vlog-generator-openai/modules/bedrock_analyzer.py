@@ -4,10 +4,21 @@ import base64
 import json
 import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+import cv2
 from openai import OpenAI
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import OPENAI_API_KEY, OPENAI_MODEL, OPENAI_BASE_URL, HIGHLIGHT_MIN_SCORE
+from config import (
+    ANALYSIS_DEDUPE, ANALYSIS_FRAMES_PER_REQUEST, ANALYSIS_MAX_OUTPUT_TOKENS, ANALYSIS_TRIAGE, TRIAGE_GRID, TRIAGE_TILE_WIDTH, TRIAGE_MIN_SCORE,
+    ANALYSIS_MAX_SIDE, ANALYSIS_IMAGE_FORMAT, ANALYSIS_IMAGE_QUALITY, ANALYSIS_IMAGE_DETAIL,
+    ANALYSIS_ROI_CROP, ANALYSIS_ROI_PADDING, ANALYSIS_ROI_MIN_SIDE, ANALYSIS_ROI_THUMBNAIL
+)
+from modules import analysis_cache, frame_dedupe
+from modules.contact_sheet import build_contact_sheet
 
 client = OpenAI(
     api_key=OPENAI_API_KEY or os.getenv("OPENAI_API_KEY"),
@@ -45,62 +56,393 @@ ANALYSIS_PROMPT = """你是一个顶级的自然摄影评审，专门负责从
 只返回纯 JSON，不要任何 Markdown 块或额外解释。"""
 
 
-def analyze_image(image_path: str, prompt: str = ANALYSIS_PROMPT) -> str:
-    """使用 GPT-4 Vision 分析图像"""
+# 单次分析的回复长度上限（也是分析缓存键的一部分）
+MAX_TOKENS = 1024
+
+
+# 上传图片的预处理参数（也是分析缓存键的一部分）
+UPLOAD_PARAMS = {
+    "max_side": ANALYSIS_MAX_SIDE,
+    "format": ANALYSIS_IMAGE_FORMAT,
+    "quality": ANALYSIS_IMAGE_QUALITY,
+    "detail": ANALYSIS_IMAGE_DETAIL
+}
+
+# 鸟框裁剪参数（也是分析缓存键的一部分）；裁剪区域超过画面该比例时直接上传整帧
+ROI_PARAMS = {
+    "padding": ANALYSIS_ROI_PADDING,
+    "min_side": ANALYSIS_ROI_MIN_SIDE,
+    "thumbnail": ANALYSIS_ROI_THUMBNAIL
+}
+ROI_MAX_AREA_RATIO = 0.6
+
+ROI_NOTE = """
+
+注意：标有「特写」的图是鸟所在区域的放大裁剪，「全景缩略图」是同一帧的整幅画面，只用于判断环境和构图；
+同一编号的特写和全景缩略图属于同一张图片，请合在一起分析。"""
+
+# 预处理结果按帧缓存（同一帧在多帧请求失败回退、重试时不必重新编码）
+_PREPARED_CACHE_SIZE = 256
+_prepared = OrderedDict()
+_upload_lock = threading.Lock()
+
+# 本进程内的上传统计（图片数 / 原始字节 / 实际上传字节 / 请求数 / 请求总耗时）
+upload_stats = {"images": 0, "original_bytes": 0, "sent_bytes": 0, "requests": 0, "request_seconds": 0.0}
+
+
+def _media_type(image_path: str) -> str:
+    ext = image_path.lower().split(".")[-1]
+    return {"jpg": "jpeg", "jpeg": "jpeg", "png": "png", "gif": "gif", "webp": "webp"}.get(ext, "jpeg")
+
+
+def prepare_image(image_path: str) -> tuple[bytes, str, int]:
+    """上传前在内存中缩放、重新编码图片（不写临时文件），按帧缓存
+    
+    长边缩到 ANALYSIS_MAX_SIDE，按 ANALYSIS_IMAGE_FORMAT / ANALYSIS_IMAGE_QUALITY 重新编码；
+    不需要缩放且重新编码后反而更大时沿用原文件。
+    
+    Returns:
+        (图片字节, 媒体类型, 原文件字节数)
+    """
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+    with _upload_lock:
+        if key in _prepared:
+            _prepared.move_to_end(key)
+            return _prepared[key]
+    
     with open(image_path, "rb") as f:
-        image_data = base64.standard_b64encode(f.read()).decode("utf-8")
+        raw = f.read()
+    prepared = (raw, _media_type(image_path), len(raw))
     
-    ext = image_path.lower().split(".")[-1]
-    media_type = {"jpg": "jpeg", "jpeg": "jpeg", "png": "png", "gif": "gif", "webp": "webp"}.get(ext, "jpeg")
+    if ANALYSIS_IMAGE_FORMAT != "original":
+        image = cv2.imread(image_path)
+        if image is not None:
+            encoded = _encode_image(image, ANALYSIS_MAX_SIDE)
+            if encoded and (max(image.shape[:2]) > ANALYSIS_MAX_SIDE > 0 or len(encoded[0]) < len(raw)):
+                prepared = (*encoded, len(raw))
+    
+    _remember_prepared(key, prepared)
+    return prepared
+
+
+def _encode_image(image, max_side: int):
+    """长边缩到 max_side（0 为不缩放）后按上传格式编码，返回 (字节, 媒体类型)，失败返回 None"""
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width) if max_side > 0 else 1.0
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    
+    if ANALYSIS_IMAGE_FORMAT == "webp":
+        ok, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, ANALYSIS_IMAGE_QUALITY])
+        return (encoded.tobytes(), "webp") if ok else None
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, ANALYSIS_IMAGE_QUALITY])
+    return (encoded.tobytes(), "jpeg") if ok else None
+
+
+def _remember_prepared(key, prepared):
+    with _upload_lock:
+        _prepared[key] = prepared
+        while len(_prepared) > _PREPARED_CACHE_SIZE:
+            _prepared.popitem(last=False)
+
+
+def roi_window(boxes: list[dict], width: int, height: int,
+               padding: float = ANALYSIS_ROI_PADDING, min_side: int = ANALYSIS_ROI_MIN_SIDE):
+    """所有鸟框的外接框，每边外扩 padding 倍宽高、至少 min_side 见方，平移到画面内
+    
+    Returns:
+        (x1, y1, x2, y2) 整数像素坐标；没有鸟框或裁剪区域超过画面 ROI_MAX_AREA_RATIO 时返回 None
+    """
+    if not boxes:
+        return None
+    x1 = min(b["box"][0] for b in boxes)
+    y1 = min(b["box"][1] for b in boxes)
+    x2 = max(b["box"][2] for b in boxes)
+    y2 = max(b["box"][3] for b in boxes)
+    
+    window = []
+    for lo, hi, limit in ((x1, x2, width), (y1, y2, height)):
+        pad = (hi - lo) * padding
+        lo, hi = lo - pad, hi + pad
+        grow = max(0.0, min(min_side, limit) - (hi - lo)) / 2
+        lo, hi = lo - grow, hi + grow
+        shift = max(0.0, -lo) - max(0.0, hi - limit)
+        lo, hi = max(0, int(lo + shift)), min(limit, int(round(hi + shift)))
+        window.append((lo, hi))
+    (x1, x2), (y1, y2) = window
+    
+    if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) > ROI_MAX_AREA_RATIO * width * height:
+        return None
+    return x1, y1, x2, y2
+
+
+def prepare_roi_images(image_path: str, boxes: list[dict]):
+    """按鸟框裁剪出特写，并可附带一张全景缩略图（ANALYSIS_ROI_THUMBNAIL），按帧缓存
+    
+    Returns:
+        (特写 (字节, 媒体类型), 缩略图 (字节, 媒体类型) 或 None, 原文件字节数)；
+        不适合裁剪（没有鸟框、鸟占画面大部分、读取失败）时返回 None
+    """
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, tuple(tuple(b["box"]) for b in boxes))
+    with _upload_lock:
+        if key in _prepared:
+            _prepared.move_to_end(key)
+            return _prepared[key]
+    
+    prepared = None
+    image = cv2.imread(image_path)
+    if image is not None:
+        window = roi_window(boxes, image.shape[1], image.shape[0])
+        if window:
+            x1, y1, x2, y2 = window
+            crop = _encode_image(image[y1:y2, x1:x2], ANALYSIS_MAX_SIDE)
+            thumbnail = _encode_image(image, ANALYSIS_ROI_THUMBNAIL) if ANALYSIS_ROI_THUMBNAIL > 0 else None
+            if crop:
+                prepared = (crop, thumbnail, stat.st_size)
+    
+    _remember_prepared(key, prepared)
+    return prepared
+
+
+def _multi_prompt(count: int) -> str:
+    """多帧打包请求的提示词：逐张按 ANALYSIS_PROMPT 分析，返回 JSON 数组"""
+    return (
+        f"下面依次给出共 {count} 张图片，编号 1-{count}。请对每张图片分别按以下要求分析，"
+        f"返回 JSON 数组（共 {count} 个元素，按编号顺序，每个元素额外包含 \"index\": 图片编号）。\n\n"
+        f"{ANALYSIS_PROMPT}"
+    )
+
+
+def _triage_prompt(count: int, grid: int) -> str:
+    """联系表粗筛的提示词：只要每格的有无鸟和高光分"""
+    return f"""这是一张 {grid}x{grid} 的网格图，共 {count} 格，每格左上角标有编号 1-{count}，每格是一帧独立的画面。
+请快速评估每一格，返回 JSON 数组（共 {count} 个元素，按编号顺序）：
+[{{"index": 编号, "has_bird": true/false, "highlight_score": 1-10}}, ...]
+
+评分标准:
+- 10分: 极其罕见的精彩瞬间
+- 7-9分: 精彩互动
+- 4-6分: 普通活动
+- 1-3分: 无主体或画面模糊
+
+只返回 JSON，不要其他内容。"""
+
+
+# 联系表粗筛统计（帧数 / 联系表张数 / 进入逐帧分析的帧数 / 粗筛结果缓存命中与未命中）
+triage_stats = {"frames": 0, "sheets": 0, "promoted": 0, "hits": 0, "misses": 0}
+
+
+def triage_frames(image_paths: list[str], grid: int = TRIAGE_GRID, tile_width: int = TRIAGE_TILE_WIDTH) -> list[dict]:
+    """把最多 grid×grid 帧拼成一张联系表，一次请求粗筛打分
     
+    Returns:
+        与 image_paths 一一对应的 {"has_bird": bool, "highlight_score": int}
+    """
+    sheet = build_contact_sheet(image_paths, grid, tile_width)
+    text = _request_analysis([(sheet, "jpeg")], _triage_prompt(len(image_paths), grid),
+                             max_tokens=min(64 * len(image_paths) + 128, ANALYSIS_MAX_OUTPUT_TOKENS))
+    return _parse_multi_analysis(text, len(image_paths))
+
+
+def analyze_image(image_path: str, prompt: str = ANALYSIS_PROMPT, boxes: list[dict] = None) -> str:
+    """使用 GPT-4 Vision 分析图像"""
+    return analyze_images([image_path], prompt, [boxes])
+
+
+def analyze_images(image_paths: list[str], prompt: str = None, boxes_list: list = None) -> str:
+    """一次请求分析多张图像（默认提示词要求返回与图片顺序对应的 JSON 数组）
+    
+    多张图像时每张图前都加上「图片 N」说明，与提示词要求的 index 对应。
+    ANALYSIS_ROI_CROP 时有鸟框（boxes_list 中对应项）的图像改为上传鸟所在区域的特写，
+    可附带一张 detail=low 的全景缩略图，提示词末尾附上 ROI_NOTE。
+    回复长度上限为每帧 MAX_TOKENS，但不超过 ANALYSIS_MAX_OUTPUT_TOKENS。
+    """
+    if prompt is None:
+        prompt = _multi_prompt(len(image_paths))
+    if boxes_list is None:
+        boxes_list = [None] * len(image_paths)
+    
+    images = []
+    cropped = False
+    for number, (path, boxes) in enumerate(zip(image_paths, boxes_list), 1):
+        label = f"图片 {number} " if len(image_paths) > 1 else ""
+        roi = prepare_roi_images(path, boxes) if ANALYSIS_ROI_CROP and boxes else None
+        if roi:
+            crop, thumbnail, original_size = roi
+            cropped = True
+            images.append((*crop, f"{label}特写：", ANALYSIS_IMAGE_DETAIL))
+            sent = len(crop[0])
+            if thumbnail:
+                images.append((*thumbnail, f"{label}全景缩略图：", "low"))
+                sent += len(thumbnail[0])
+        else:
+            image_bytes, media_type, original_size = prepare_image(path)
+            images.append((image_bytes, media_type, f"{label}整帧：", ANALYSIS_IMAGE_DETAIL))
+            sent = len(image_bytes)
+        with _upload_lock:
+            upload_stats["images"] += 1
+            upload_stats["original_bytes"] += original_size
+            upload_stats["sent_bytes"] += sent
+    
+    if cropped:
+        prompt += ROI_NOTE
+    elif len(image_paths) == 1:
+        images = [image[:2] for image in images]
+    max_tokens = min(MAX_TOKENS * len(image_paths), ANALYSIS_MAX_OUTPUT_TOKENS)
+    return _request_analysis(images, prompt, max_tokens=max_tokens, detail=ANALYSIS_IMAGE_DETAIL)
+
+
+def _request_analysis(images: list[tuple], prompt: str, max_tokens: int = MAX_TOKENS, detail: str = "auto") -> str:
+    """发送图片 [(字节, 媒体类型[, 说明文字, detail]), ...] 给视觉模型，返回原始回复文本"""
+    content = [{"type": "text", "text": prompt}]
+    for image in images:
+        image_bytes, media_type = image[:2]
+        caption, image_detail = image[2:] if len(image) > 2 else (None, detail)
+        if caption:
+            content.append({"type": "text", "text": caption})
+        image_data = base64.standard_b64encode(image_bytes).decode("utf-8")
+        content.append({
+            "type": "image_url",
+            "image_url": {"url": f"data:image/{media_type};base64,{image_data}", "detail": image_detail}
+        })
+    
+    start = time.perf_counter()
     response = client.chat.completions.create(
         model=OPENAI_MODEL,
         messages=[
             {
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt},
-                    {"type": "image_url", "image_url": {"url": f"data:image/{media_type};base64,{image_data}"}}
-                ]
+                "content": content
             }
         ],
-        max_tokens=1024
+        max_tokens=max_tokens
     )
+    with _upload_lock:
+        upload_stats["requests"] += 1
+        upload_stats["request_seconds"] += time.perf_counter() - start
     
     return response.choices[0].message.content
 
 
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def batch_analyze(image_data_list: list, max_workers: int = 5, progress_callback=None) -> list[dict]:
+
+def _parse_analysis(text: str) -> dict:
+    """解析模型回复中的 JSON（兼容 ``` 代码块包裹）"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+    return json.loads(text)
+
+
+def _analysis_cache_key(path: str, boxes: list[dict] = None) -> str:
+    """按图片字节 + 提示词 + 模型与上传参数（裁剪时含鸟框）计算分析缓存键，读取失败返回 None（交给分析阶段报错）"""
+    try:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+    except OSError:
+        return None
+    params = {"max_tokens": MAX_TOKENS, **UPLOAD_PARAMS}
+    if ANALYSIS_ROI_CROP and boxes:
+        params["roi"] = {**ROI_PARAMS, "boxes": [b["box"] for b in boxes]}
+    return analysis_cache.make_key(image_bytes, ANALYSIS_PROMPT, OPENAI_MODEL, params)
+
+
+def _triage_cache_key(path: str) -> str:
+    """联系表粗筛结果的缓存键：图片字节 + 粗筛提示词 + 模型 + 联系表参数，读取失败返回 None
+    
+    与逐帧分析的键分开存放，关闭粗筛后不会把粗筛结果当作完整分析读出来。
+    """
+    try:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+    except OSError:
+        return None
+    params = {"triage_grid": TRIAGE_GRID, "triage_tile_width": TRIAGE_TILE_WIDTH}
+    prompt = _triage_prompt(TRIAGE_GRID * TRIAGE_GRID, TRIAGE_GRID)
+    return analysis_cache.make_key(image_bytes, prompt, OPENAI_MODEL, params)
+
+
+def _parse_multi_analysis(text: str, count: int) -> list[dict]:
+    """解析多帧请求返回的 JSON 数组，按 index（缺省按顺序）对齐；数量或格式不符时抛出 ValueError"""
+    items = _parse_analysis(text)
+    if not isinstance(items, list) or len(items) != count or not all(isinstance(x, dict) for x in items):
+        raise ValueError(f"期望 {count} 个元素的 JSON 数组")
+    
+    if all(isinstance(x.get("index"), int) for x in items):
+        if sorted(x["index"] for x in items) != list(range(1, count + 1)):
+            raise ValueError("JSON 数组的 index 与图片编号不对应")
+        items = sorted(items, key=lambda x: x["index"])
+    return [{k: v for k, v in x.items() if k != "index"} for x in items]
+
+
+def batch_analyze(
+    image_data_list: list,
+    max_workers: int = 5,
+    progress_callback=None,
+    frames_per_request: int = ANALYSIS_FRAMES_PER_REQUEST,
+    triage: bool = ANALYSIS_TRIAGE
+) -> list[dict]:
     """批量分析图像（支持并行处理）
     
+    ANALYSIS_DEDUPE 时先按感知哈希把几乎相同的帧分组，每组只分析代表帧，其余帧继承其分析结果
+    （保留各自的时间戳、视频等信息）。
+    提交前先查分析缓存（图片内容、提示词、模型都没变时直接复用上次的回复），只有未命中的帧才调用视觉模型。
+    frames_per_request > 1 时把未命中的帧每 N 帧打包成一次请求（返回 JSON 数组），
+    减少往返次数和重复的提示词开销；某个包解析失败时该包改为逐帧请求。
+    N 不超过 ANALYSIS_MAX_OUTPUT_TOKENS // MAX_TOKENS，保证每帧都有完整的回复长度。
+    triage 时先把未命中的帧每 TRIAGE_GRID×TRIAGE_GRID 帧拼成一张联系表粗筛打分，
+    只有得分达到 TRIAGE_MIN_SCORE 的帧再逐帧分析，其余帧直接采用粗筛结果（triage_only）；
+    粗筛结果按帧另行缓存（与逐帧分析的键分开），重跑时已粗筛过的帧不再拼联系表。
+    ANALYSIS_ROI_CROP 时关键帧信息里带 bird_boxes 的帧只上传鸟所在区域的特写（见 analyze_images）。
+    
     Args:
         image_data_list: 图片路径列表 [str, ...] 或关键帧信息列表 [{"path": str, ...}, ...]
         max_workers: 最大并行线程数
         progress_callback: 进度回调函数
+        frames_per_request: 每次请求的帧数
+        triage: 是否先用联系表粗筛
     """
+    max_per_request = max(1, ANALYSIS_MAX_OUTPUT_TOKENS // MAX_TOKENS)
+    if frames_per_request > max_per_request:
+        print(f"  ⚠️ 回复上限 {ANALYSIS_MAX_OUTPUT_TOKENS} tokens 最多容纳 {max_per_request} 帧，"
+              f"每次请求的帧数改为 {max_per_request}")
+        frames_per_request = max_per_request
+    
     results = [None] * len(image_data_list)
-    total = len(image_data_list)
+    paths = [d.get("path") if isinstance(d, dict) else d for d in image_data_list]
+    boxes = [d.get("bird_boxes") if isinstance(d, dict) else None for d in image_data_list]
+    
+    rep_of = list(range(len(image_data_list)))
+    if ANALYSIS_DEDUPE and len(image_data_list) > 1:
+        bird_counts = [d.get("bird_count") if isinstance(d, dict) else None for d in image_data_list]
+        rep_of = frame_dedupe.cluster_frames(paths, groups=bird_counts)
+    total = len(set(rep_of))
+    
+    def finish(index, image_data, path, text):
+        return merge(index, image_data, path, _parse_analysis(text))
     
-    def worker(index, image_data):
+    def merge(index, image_data, path, data):
+        # 合并原始信息
+        if isinstance(image_data, dict):
+            data.update(image_data)
+        
+        data["frame_path"] = path
+        data["frame_index"] = index
+        return data
+    
+    def worker(index, image_data, cache_key):
         # 兼容字符串路径和字典对象
         path = image_data.get("path") if isinstance(image_data, dict) else image_data
         
         try:
-            text = analyze_image(path)
-            text = text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0]
-            
-            data = json.loads(text)
-            
-            # 合并原始信息
-            if isinstance(image_data, dict):
-                data.update(image_data)
-            
-            data["frame_path"] = path
-            data["frame_index"] = index
+            text = analyze_image(path, boxes=boxes[index])
+            data = finish(index, image_data, path, text)
+            if cache_key:
+                analysis_cache.store(cache_key, text)
             return index, data
             
         except Exception as e:
@@ -116,17 +458,137 @@ def batch_analyze(image_data_list: list, max_workers: int = 5, progress_callback
                 # 保留原始的时间戳等信息
                 fallback.update(image_data)
             return index, fallback
+    
+    def multi_worker(chunk):
+        chunk_paths = [paths[index] for index, _, _ in chunk]
+        try:
+            chunk_boxes = [boxes[index] for index, _, _ in chunk]
+            items = _parse_multi_analysis(analyze_images(chunk_paths, boxes_list=chunk_boxes), len(chunk))
+        except Exception as e:
+            print(f"  多帧分析失败（{len(chunk)} 帧），改为逐帧请求: {e}")
+            return [worker(*item) for item in chunk]
+        
+        done = []
+        for (index, image_data, cache_key), item in zip(chunk, items):
+            text = json.dumps(item, ensure_ascii=False)
+            if cache_key:
+                analysis_cache.store(cache_key, text)
+            done.append((index, finish(index, image_data, paths[index], text)))
+        return done
 
+    count = 0
+    pending = []
+    for i, image_data in enumerate(image_data_list):
+        if rep_of[i] != i:
+            continue
+        path = paths[i]
+        cache_key = _analysis_cache_key(path, boxes[i])
+        cached = analysis_cache.load(cache_key) if cache_key else None
+        if cached is not None:
+            try:
+                results[i] = finish(i, image_data, path, cached)
+                count += 1
+                if progress_callback:
+                    progress_callback(count, total)
+                continue
+            except ValueError:
+                pass
+        pending.append((i, image_data, cache_key))
+    
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_index = {executor.submit(worker, i, data): i for i, data in enumerate(image_data_list)}
+        if triage and len(pending) > 1:
+            promoted = []
+            
+            def apply_triage(item, score):
+                nonlocal count
+                try:
+                    highlight_score = int(score.get("highlight_score", 0))
+                except (TypeError, ValueError):
+                    highlight_score = 0
+                if highlight_score >= TRIAGE_MIN_SCORE:
+                    promoted.append(item)
+                    return
+                index, image_data, _ = item
+                results[index] = merge(index, image_data, paths[index], {
+                    "has_bird": bool(score.get("has_bird")),
+                    "bird_species": None,
+                    "activity": "",
+                    "scene_description": "",
+                    "highlight_score": highlight_score,
+                    "timestamp_suggestion": "",
+                    "triage_only": True
+                })
+                count += 1
+                if progress_callback:
+                    progress_callback(count, total)
+            
+            # 先用缓存的粗筛结果（得分门槛在读出后再比较，改 TRIAGE_MIN_SCORE 不必重新粗筛）
+            unscored = []
+            triage_keys = {}
+            for item in pending:
+                triage_key = _triage_cache_key(paths[item[0]])
+                cached = analysis_cache.load(triage_key, counter=triage_stats) if triage_key else None
+                if cached is not None:
+                    try:
+                        apply_triage(item, json.loads(cached))
+                        continue
+                    except (ValueError, AttributeError):
+                        pass
+                triage_keys[item[0]] = triage_key
+                unscored.append(item)
+            
+            per_sheet = TRIAGE_GRID * TRIAGE_GRID
+            chunks = [unscored[start:start + per_sheet] for start in range(0, len(unscored), per_sheet)]
+            if len(unscored) == 1:
+                # 只剩一帧时拼联系表省不了请求
+                chunks = []
+                promoted.extend(unscored)
+            futures = {executor.submit(triage_frames, [paths[index] for index, _, _ in chunk]): chunk for chunk in chunks}
+            
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    scores = future.result()
+                except Exception as e:
+                    print(f"  联系表粗筛失败（{len(chunk)} 帧），改为逐帧分析: {e}")
+                    promoted.extend(chunk)
+                    continue
+                
+                for item, score in zip(chunk, scores):
+                    if triage_keys[item[0]]:
+                        analysis_cache.store(triage_keys[item[0]], json.dumps(score, ensure_ascii=False))
+                    apply_triage(item, score)
+            
+            triage_stats["frames"] += len(pending)
+            triage_stats["sheets"] += len(chunks)
+            triage_stats["promoted"] += len(promoted)
+            pending = sorted(promoted, key=lambda item: item[0])
+        
+        if frames_per_request > 1:
+            futures = [
+                executor.submit(multi_worker, pending[start:start + frames_per_request])
+                for start in range(0, len(pending), frames_per_request)
+            ]
+        else:
+            futures = [executor.submit(lambda item: [worker(*item)], item) for item in pending]
         
-        count = 0
-        for future in as_completed(future_to_index):
-            idx, result = future.result()
-            results[idx] = result
-            count += 1
-            if progress_callback:
-                progress_callback(count, total)
+        for future in as_completed(futures):
+            for idx, result in future.result():
+                results[idx] = result
+                count += 1
+                if progress_callback:
+                    progress_callback(count, total)
+    
+    # 同组的其他帧继承代表帧的分析结果
+    for i, image_data in enumerate(image_data_list):
+        if rep_of[i] != i:
+            data = dict(results[rep_of[i]])
+            if isinstance(image_data, dict):
+                data.update(image_data)
+            data["frame_path"] = paths[i]
+            data["frame_index"] = i
+            data["duplicate_of"] = paths[rep_of[i]]
+            results[i] = data
     
     return results
 
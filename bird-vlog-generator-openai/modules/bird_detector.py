@@ -1,20 +1,397 @@
-"""鸟类检测模块 - 使用 YOLOv8"""
+"""鸟类检测模块 - 使用 YOLOv8
 
+预取模型权重并生成融合模型缓存（构建镜像时执行一次，之后可离线运行）：
+    python -m modules.bird_detector prefetch-models
+
+并行处理多个视频时的扩展性测试（依次用 1..N 个并行视频跑鸟类抽帧）：
+    python -m modules.bird_detector bench 视频1.mp4 视频2.mp4 ... [--max-jobs N]
+
+一批短片段逐个在新进程中做鸟类抽帧，对比冷启动与经检测守护进程的耗时：
+    python -m modules.bird_detector latency 片段1.mp4 片段2.mp4 ...
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
 import os
-from ultralytics import YOLO
+import queue
+import secrets
+import stat
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from multiprocessing.connection import Client, AuthenticationError
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import (
+    DETECT_DAEMON_SOCKET, DETECT_DAEMON_AUTHKEY_FILE, DETECT_BACKEND,
+    DETECT_BATCH_SIZE, DETECT_QUEUE_SIZE, DETECT_DECODE_WORKERS, DETECT_TILE_MODE, DETECT_TILE_SIZE,
+    DETECT_POOL_SIZE, DETECT_TORCH_THREADS, YOLO_WEIGHTS_DIR, YOLO_WEIGHTS_SHA256, YOLO_OFFLINE, ONNX_INT8
+)
+
+# 使用 YOLOv8n（最小最快的版本），检测索引也以此区分模型
+MODEL_NAME = 'yolov8n.pt'
+
+# COCO 数据集中 bird 的类别 ID 是 14
+BIRD_CLASS_ID = 14
+
+# ultralytics 预测的默认置信度下限
+BASE_CONFIDENCE = 0.25
+
+# 切片检测：相邻切片的重叠比例、合并重复框的阈值（交集占较小框面积的比例）
+TILE_OVERLAP = 0.2
+TILE_MERGE_OVERLAP = 0.5
+
+# 切片检测找运动区域时的分析宽度、判定像素有变化的灰度差
+TILE_MOTION_WIDTH = 640
+TILE_MOTION_DELTA = 25
+
+# 切片检测统计（帧数 / 切片推理数）
+tile_stats = {"frames": 0, "tiles": 0}
+
+# 模型池（懒加载）：已创建的全部实例 / 空闲实例，创建过程由 _model_lock 保护
+_models = []
+_idle_models = queue.Queue()
+_model_lock = threading.Lock()
+_pool_size = None
+_model_source = None  # 校验后实际加载的模型文件（进程内只解析一次）
+
+# 与检测守护进程的连接（进程内复用）；守护进程的模型与本进程不一致时本进程不再使用它
+_daemon_conn = None
+_daemon_lock = threading.Lock()
+_daemon_mismatch = False
+
+
+class BirdDetections:
+    """单帧的鸟类检测结果（NumPy 存储，比 list[dict] 紧凑），只在 API 边界转换为字典"""
+    
+    __slots__ = ("confidences", "boxes")
+    
+    def __init__(self, confidences=None, boxes=None):
+        self.confidences = np.zeros(0, dtype=np.float32) if confidences is None else confidences  # (N,)
+        self.boxes = np.zeros((0, 4), dtype=np.float32) if boxes is None else boxes  # (N, 4) x1, y1, x2, y2
+    
+    @property
+    def has_bird(self) -> bool:
+        return len(self.confidences) > 0
+    
+    @property
+    def bird_count(self) -> int:
+        return len(self.confidences)
+    
+    @property
+    def confidence(self) -> float:
+        """最高置信度，无鸟时为 0"""
+        return float(self.confidences.max()) if len(self.confidences) else 0
+    
+    def box_list(self) -> list[dict]:
+        """[{"confidence": float, "box": [x1, y1, x2, y2]}, ...]"""
+        return [
+            {"confidence": conf, "box": box}
+            for conf, box in zip(self.confidences.tolist(), self.boxes.tolist())
+        ]
+    
+    def to_dict(self) -> dict:
+        return {
+            "has_bird": self.has_bird,
+            "bird_count": self.bird_count,
+            "confidence": self.confidence,
+            "boxes": self.box_list()
+        }
+
+
+def pool_size() -> int:
+    """模型池大小：DETECT_POOL_SIZE，0 时按 CPU 核数（每个实例至少 2 个线程）"""
+    if _pool_size is not None:
+        return _pool_size
+    if DETECT_POOL_SIZE > 0:
+        return DETECT_POOL_SIZE
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def torch_threads() -> int:
+    """每个模型实例的 torch 线程数：默认把 CPU 核数平均分给池中各实例，避免超额订阅"""
+    if DETECT_TORCH_THREADS > 0:
+        return DETECT_TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // pool_size())
+
+
+def _apply_thread_budget():
+    """设置 torch 的线程数
+    
+    torch 的 intra-op 线程池是进程级的，实例并发推理时各自占用 torch_threads() 个线程，
+    总数不超过 CPU 核数；inter-op 线程只能在首次并行计算前设置一次。
+    """
+    import torch
+    torch.set_num_threads(torch_threads())
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def set_pool_size(size: int):
+    """调整模型池大小（并同步调整线程预算），已创建的实例保留"""
+    global _pool_size
+    with _model_lock:
+        _pool_size = max(1, size)
+        if _models:
+            _apply_thread_budget()
+
+
+def weights_path() -> str:
+    """本地权重路径（YOLO_WEIGHTS_DIR/MODEL_NAME）"""
+    return os.path.join(YOLO_WEIGHTS_DIR, MODEL_NAME)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_weights(path: str) -> str:
+    """校验权重文件，返回其 SHA-256
+    
+    期望值取 YOLO_WEIGHTS_SHA256（默认固定为官方权重的值）；显式设为空时只计算不校验。
+    """
+    digest = _file_sha256(path)
+    expected = YOLO_WEIGHTS_SHA256
+    if expected and digest != expected.lower():
+        raise ValueError(f"模型权重校验失败: {path}（期望 {expected}，实际 {digest}）")
+    return digest
+
+
+def download_weights(path: str) -> str:
+    """下载权重到 path 并立即校验，校验失败时删除下载的文件"""
+    from ultralytics.utils.downloads import attempt_download_asset
+    
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    attempt_download_asset(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"模型权重下载失败: {path}")
+    try:
+        verify_weights(path)
+    except ValueError:
+        os.remove(path)
+        raise
+    return path
+
+
+def fused_model_path(digest: str) -> str:
+    """融合模型缓存路径，文件名带权重哈希，权重更换后自动失效"""
+    stem = os.path.splitext(MODEL_NAME)[0]
+    return os.path.join(YOLO_WEIGHTS_DIR, f"{stem}.{digest[:12]}.fused.pt")
 
-# 全局模型实例（懒加载）
-_model = None
+
+def build_fused_model(weights: str, output_path: str) -> str:
+    """把 Conv+BN 融合后的模型另存为 checkpoint
+    
+    ultralytics 加载后发现模型已融合就不再重复融合，省去每次启动的融合开销。
+    """
+    import torch
+    
+    ckpt = torch.load(weights, map_location="cpu", weights_only=False)
+    model = (ckpt.get("ema") or ckpt["model"]).float().fuse(verbose=False)
+    ckpt.update(model=model.half(), ema=None, optimizer=None)
+    
+    tmp_path = output_path + ".tmp"
+    torch.save(ckpt, tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def resolve_model_source(allow_download: bool = not YOLO_OFFLINE) -> str:
+    """返回要加载的模型文件：校验本地权重，优先使用融合模型缓存（没有则生成）
+    
+    本地没有权重时，allow_download 为 False（离线模式）直接报错，否则下载到 YOLO_WEIGHTS_DIR。
+    """
+    path = weights_path()
+    if not os.path.exists(path):
+        if not allow_download:
+            raise FileNotFoundError(
+                f"模型权重不存在: {path}，请先联网运行 python -m modules.bird_detector prefetch-models"
+            )
+        print(f"  ⬇️ 下载模型权重: {path}")
+        download_weights(path)
+    
+    fused = fused_model_path(verify_weights(path))
+    if not os.path.exists(fused):
+        try:
+            build_fused_model(path, fused)
+        except Exception as e:
+            print(f"  ⚠️ 融合模型缓存生成失败，使用原始权重: {e}")
+            return path
+    return fused
+
+
+def prefetch_models() -> list[str]:
+    """预取当前后端需要的全部模型文件，返回其路径"""
+    source = resolve_model_source(allow_download=True)
+    paths = [weights_path(), source]
+    if DETECT_BACKEND == "onnx":
+        from modules.onnx_backend import onnx_model_path, export_model
+        if not os.path.exists(onnx_model_path()):
+            export_model(int8=ONNX_INT8)
+        paths.append(onnx_model_path())
+    return paths
+
+
+def _create_model():
+    """创建一个模型实例并加入池中（调用方持有 _model_lock）"""
+    global _model_source
+    from ultralytics import YOLO
+    if not _models:
+        _apply_thread_budget()
+    if _model_source is None:
+        _model_source = resolve_model_source()
+    model = YOLO(_model_source, task="detect")
+    _models.append(model)
+    return model
 
 
 def get_model():
-    """获取或初始化 YOLO 模型"""
-    global _model
-    if _model is None:
-        # 使用 YOLOv8n（最小最快的版本）
-        # 首次运行会自动下载模型
-        _model = YOLO('yolov8n.pt')
-    return _model
+    """获取或初始化 YOLO 模型（首次调用才导入 ultralytics/torch，多线程并发调用也只创建一次）
+    
+    返回池中第一个实例，用于预热、导出等不做并发推理的场合；推理请用 acquire_model。
+    """
+    with _model_lock:
+        if not _models:
+            _idle_models.put(_create_model())
+        return _models[0]
+
+
+@contextlib.contextmanager
+def acquire_model():
+    """从模型池借出一个实例独占使用：有空闲直接用，池未满则新建，否则等待归还"""
+    try:
+        model = _idle_models.get_nowait()
+    except queue.Empty:
+        with _model_lock:
+            model = _create_model() if len(_models) < pool_size() else None
+        if model is None:
+            model = _idle_models.get()
+    
+    try:
+        yield model
+    finally:
+        _idle_models.put(model)
+
+
+def warm_up():
+    """预先加载当前后端的模型"""
+    if DETECT_BACKEND == "onnx":
+        from modules.onnx_backend import get_session
+        get_session()
+    else:
+        get_model()
+
+
+def model_id() -> str:
+    """当前检测模型的标识（后端 + 权重），用于检测索引失效判断"""
+    if DETECT_BACKEND == "onnx":
+        from modules.onnx_backend import onnx_model_path
+        return f"onnx:{os.path.basename(onnx_model_path())}"
+    return MODEL_NAME
+
+
+def _owned_by_me(path: str, kind) -> bool:
+    """path 是当前用户拥有的指定类型文件（不跟随符号链接），且组和其他用户没有任何权限"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return kind(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+
+def daemon_authkey(create: bool = False) -> bytes:
+    """读取检测守护进程的口令（DETECT_DAEMON_AUTHKEY_FILE）
+    
+    口令文件必须属于当前用户且权限为 0600，否则拒绝使用；create 时（守护进程启动）不存在则生成随机口令。
+    
+    Returns:
+        口令；没有可用的口令文件时返回 None
+    """
+    path = DETECT_DAEMON_AUTHKEY_FILE
+    if create and not os.path.lexists(path):
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    
+    if not _owned_by_me(path, stat.S_ISREG):
+        if create:
+            raise PermissionError(f"守护进程口令文件不属于当前用户或权限过宽（应为 0600）: {path}")
+        return None
+    with open(path) as f:
+        return f.read().strip().encode()
+
+
+def _daemon_request(request: tuple):
+    """向检测守护进程发送一个请求，返回 (status, payload)；守护进程不可用时返回 None
+    
+    只连接属于当前用户的 socket，并用随机口令双向认证后才接收（反序列化）回复。
+    连接时先 ping 比对模型标识：守护进程加载的后端/模型与本进程的 model_id() 不同时，
+    其结果会以本进程的模型写入检测索引，所以改在本进程推理。
+    """
+    global _daemon_conn, _daemon_mismatch
+    if _daemon_mismatch or not DETECT_DAEMON_SOCKET or not _owned_by_me(DETECT_DAEMON_SOCKET, stat.S_ISSOCK):
+        return None
+    
+    with _daemon_lock:
+        try:
+            if _daemon_conn is None:
+                authkey = daemon_authkey()
+                if authkey is None:
+                    return None
+                conn = Client(DETECT_DAEMON_SOCKET, family="AF_UNIX", authkey=authkey)
+                conn.send(("ping",))
+                status, remote_id = conn.recv()
+                if status != "ok" or remote_id != model_id():
+                    conn.close()
+                    _daemon_mismatch = True
+                    print(f"  ⚠️ 检测守护进程的模型（{remote_id}）与本进程（{model_id()}）不一致，改在本进程推理")
+                    return None
+                _daemon_conn = conn
+            _daemon_conn.send(request)
+            return _daemon_conn.recv()
+        except (OSError, EOFError, AuthenticationError):
+            _daemon_conn = None
+            return None
+
+
+def daemon_model_id() -> str:
+    """检测守护进程加载的模型标识，守护进程未运行或模型与本进程不一致时返回 None"""
+    reply = _daemon_request(("ping",))
+    if reply is None or reply[0] != "ok":
+        return None
+    return reply[1]
+
+
+def _detect_via_daemon(sources: list, confidence: float) -> list[BirdDetections]:
+    """检测守护进程在运行时交给它处理（模型常驻，免去加载开销），否则返回 None
+    
+    Args:
+        sources: 图像帧或图片绝对路径列表
+    """
+    reply = _daemon_request(("detect", sources, confidence))
+    if reply is None:
+        # 守护进程不可用，回退到本进程推理
+        return None
+    
+    status, payload = reply
+    if status != "ok":
+        raise RuntimeError(f"检测守护进程出错: {payload}")
+    return payload
 
 
 def detect_bird(image_path: str, confidence: float = 0.3) -> dict:
@@ -32,103 +409,275 @@ def detect_bird(image_path: str, confidence: float = 0.3) -> dict:
             "boxes": list  # 边界框列表
         }
     """
-    model = get_model()
-    
-    # YOLO 检测
-    results = model(image_path, verbose=False)
-    
-    # COCO 数据集中 bird 的类别 ID 是 14
-    BIRD_CLASS_ID = 14
-    
-    bird_detections = []
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            cls_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            
-            if cls_id == BIRD_CLASS_ID and conf >= confidence:
-                bird_detections.append({
-                    "confidence": conf,
-                    "box": box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-                })
-    
-    return {
-        "has_bird": len(bird_detections) > 0,
-        "bird_count": len(bird_detections),
-        "confidence": max([d["confidence"] for d in bird_detections]) if bird_detections else 0,
-        "boxes": bird_detections
-    }
+    return detect_bird_records([os.path.abspath(image_path)], confidence)[0].to_dict()
 
 
-def detect_bird_in_frame(frame, confidence: float = 0.3) -> dict:
+def detect_bird_in_frame(frame, confidence: float = 0.3, previous=None, tile_mode: str = DETECT_TILE_MODE) -> dict:
     """检测 OpenCV 帧中是否有鸟类（不保存到磁盘）
     
     Args:
         frame: OpenCV 图像帧 (numpy array)
         confidence: 置信度阈值
+        previous: 同机位的上一帧，tile_mode="motion" 时用来找运动区域
+        tile_mode: off / motion / full，见 detect_tiled_records
         
     Returns:
         检测结果字典
     """
-    model = get_model()
+    return detect_tiled_records(frame, previous, confidence, tile_mode).to_dict()
+
+
+def detect_birds_in_frames(frames: list, confidence: float = 0.3) -> list[dict]:
+    """批量检测多帧中的鸟类（一次推理，分摊每次调用的固定开销）
     
-    # YOLO 可以直接接受 numpy array
-    results = model(frame, verbose=False)
+    Args:
+        frames: OpenCV 图像帧列表
+        confidence: 置信度阈值
+        
+    Returns:
+        与 frames 一一对应的检测结果字典列表（格式同 detect_bird_in_frame）
+    """
+    return [r.to_dict() for r in detect_bird_records(frames, confidence)]
+
+
+def detect_bird_records(sources: list, confidence: float = 0.3) -> list[BirdDetections]:
+    """批量检测（图像帧或图片绝对路径），返回紧凑的 BirdDetections 列表
     
-    BIRD_CLASS_ID = 14
+    检测守护进程在运行时交给它处理，否则在本进程推理。
+    """
+    if not sources:
+        return []
     
-    bird_detections = []
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            cls_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            
-            if cls_id == BIRD_CLASS_ID and conf >= confidence:
-                bird_detections.append({
-                    "confidence": conf,
-                    "box": box.xyxy[0].tolist()
-                })
+    remote = _detect_via_daemon(list(sources), confidence)
+    if remote is not None:
+        return remote
     
+    return detect_local(sources, confidence)
+
+
+def detect_local(sources: list, confidence: float = 0.3) -> list[BirdDetections]:
+    """在本进程中批量推理（图像帧或图片路径均可），不经过检测守护进程
+    
+    DETECT_BACKEND=onnx 时使用 onnxruntime 后端，返回格式相同。
+    """
+    if not sources:
+        return []
+    
+    if DETECT_BACKEND == "onnx":
+        from modules.onnx_backend import detect_onnx
+        return detect_onnx(sources, confidence)
+    
+    # 只让模型输出鸟类，置信度过滤也交给模型（不低于默认下限，与逐框过滤结果一致）
+    with acquire_model() as model:
+        results = model(list(sources), classes=[BIRD_CLASS_ID], conf=max(BASE_CONFIDENCE, confidence), verbose=False)
+    
+    return [
+        BirdDetections(
+            result.boxes.conf.cpu().numpy().astype(np.float32),
+            result.boxes.xyxy.cpu().numpy().astype(np.float32)
+        )
+        for result in results
+    ]
+
+
+def _read_image(path: str):
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"无法读取图片: {path}")
+    return image
+
+
+def _decode_images(image_paths: list[str], workers: int, queue_size: int):
+    """在线程池中预读并解码图片，按原顺序产出 (path, image, error)
+    
+    同时在途的图片不超过 queue_size 张，内存占用与文件夹大小无关。
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        paths = iter(image_paths)
+        
+        for path in paths:
+            pending.append((path, pool.submit(_read_image, path)))
+            if len(pending) >= max(1, queue_size):
+                break
+        
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(_read_image, next_path)))
+            try:
+                yield path, future.result(), None
+            except Exception as e:
+                yield path, None, e
+
+
+def _error_result(path: str, error: Exception) -> dict:
     return {
-        "has_bird": len(bird_detections) > 0,
-        "bird_count": len(bird_detections),
-        "confidence": max([d["confidence"] for d in bird_detections]) if bird_detections else 0,
-        "boxes": bird_detections
+        "path": path,
+        "has_bird": False,
+        "bird_count": 0,
+        "confidence": 0,
+        "error": str(error)
     }
 
 
-def batch_detect(image_paths: list[str], confidence: float = 0.3, progress_callback=None) -> list[dict]:
+def motion_regions(frame, previous) -> list[tuple]:
+    """与上一帧做低分辨率帧差，返回运动区域 [(x, y, w, h), ...]（原图坐标）"""
+    height, width = frame.shape[:2]
+    scale = min(1.0, TILE_MOTION_WIDTH / width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    
+    smalls = [
+        cv2.resize(image, size, interpolation=cv2.INTER_AREA) if scale < 1 else image
+        for image in (frame, previous)
+    ]
+    # 按通道取最大差值（鸟的颜色和背景亮度相近时灰度差会漏掉）
+    diff = cv2.absdiff(smalls[0], smalls[1]).max(axis=2)
+    mask = (diff > TILE_MOTION_DELTA).astype(np.uint8)
+    mask = cv2.dilate(mask, np.ones((7, 7), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    return [
+        tuple(int(round(v / scale)) for v in cv2.boundingRect(contour))
+        for contour in contours
+    ]
+
+
+def _tile_starts(tile: int, limit: int) -> list[int]:
+    """沿一个方向覆盖 [0, limit) 的切片起点（相邻切片重叠 TILE_OVERLAP）"""
+    if tile >= limit:
+        return [0]
+    step = max(1, int(tile * (1 - TILE_OVERLAP)))
+    return list(range(0, limit - tile, step)) + [limit - tile]
+
+
+def tile_windows(shape: tuple, tile: int, regions: list[tuple] = None) -> list[tuple]:
+    """切片窗口 [(x, y, w, h), ...]：regions 为 None 时覆盖整帧，否则只保留与这些区域相交的整帧切片
+    
+    运动区域吸附到整帧切片的网格上，零散的小运动区域共用所在的切片，切片数不会超过整帧切片。
+    """
+    height, width = shape[:2]
+    windows = [
+        (tx, ty, min(tile, width), min(tile, height))
+        for ty in _tile_starts(tile, height)
+        for tx in _tile_starts(tile, width)
+    ]
+    if regions is None:
+        return windows
+    return [
+        (tx, ty, tw, th) for tx, ty, tw, th in windows
+        if any(x < tx + tw and tx < x + w and y < ty + th and ty < y + h for x, y, w, h in regions)
+    ]
+
+
+def _merge_records(records: list[BirdDetections], offsets: list[tuple]) -> BirdDetections:
+    """把各切片的框平移回原图坐标后合并重复框
+    
+    同一只鸟可能在整帧和多个重叠切片里各出一个框（被切片边缘截断的只是一部分），
+    所以按置信度从高到低保留，与已保留框的交集占较小框面积超过 TILE_MERGE_OVERLAP 的视为重复。
+    """
+    confidences = np.concatenate([r.confidences for r in records]).astype(np.float32)
+    boxes = np.concatenate([
+        r.boxes + np.array([x, y, x, y], dtype=np.float32) for r, (x, y) in zip(records, offsets)
+    ]).reshape(-1, 4).astype(np.float32)
+    
+    areas = np.maximum(boxes[:, 2] - boxes[:, 0], 0) * np.maximum(boxes[:, 3] - boxes[:, 1], 0)
+    keep = []
+    for i in np.argsort(-confidences, kind="stable"):
+        if keep:
+            kept = boxes[keep]
+            iw = np.minimum(kept[:, 2], boxes[i, 2]) - np.maximum(kept[:, 0], boxes[i, 0])
+            ih = np.minimum(kept[:, 3], boxes[i, 3]) - np.maximum(kept[:, 1], boxes[i, 1])
+            inter = np.maximum(iw, 0) * np.maximum(ih, 0)
+            smaller = np.maximum(np.minimum(areas[keep], areas[i]), 1e-6)
+            if (inter / smaller > TILE_MERGE_OVERLAP).any():
+                continue
+        keep.append(i)
+    return BirdDetections(confidences[keep], boxes[keep])
+
+
+def detect_tiled_records(
+    frame,
+    previous=None,
+    confidence: float = 0.3,
+    tile_mode: str = DETECT_TILE_MODE,
+    tile_size: int = DETECT_TILE_SIZE
+) -> BirdDetections:
+    """整帧检测 + 切片检测，提高 4K 等大画面中远处小鸟的召回
+    
+    - off: 只做整帧检测
+    - motion: 只对与 previous 相比有运动的区域切片（没有 previous 时退化为 off）
+    - full: 整帧均匀切片
+    整帧和所有切片一次批量推理，切片结果平移回原图坐标后与整帧结果一起做 NMS 合并。
+    """
+    height, width = frame.shape[:2]
+    windows = []
+    if max(height, width) > tile_size:
+        if tile_mode == "full":
+            windows = tile_windows(frame.shape, tile_size)
+        elif tile_mode == "motion" and previous is not None and previous.shape == frame.shape:
+            windows = tile_windows(frame.shape, tile_size, motion_regions(frame, previous))
+    
+    if not windows:
+        return detect_bird_records([frame], confidence)[0]
+    
+    tiles = [frame[y:y + h, x:x + w] for x, y, w, h in windows]
+    records = detect_bird_records([frame] + tiles, confidence)
+    tile_stats["frames"] += 1
+    tile_stats["tiles"] += len(tiles)
+    return _merge_records(records, [(0, 0)] + [(x, y) for x, y, _, _ in windows])
+
+
+def batch_detect(image_paths: list[str], confidence: float = 0.3, progress_callback=None,
+                 batch_size: int = DETECT_BATCH_SIZE, workers: int = DETECT_DECODE_WORKERS,
+                 queue_size: int = DETECT_QUEUE_SIZE) -> list[dict]:
     """批量检测图片中的鸟类
     
+    图片在线程池中预读解码，同时主线程按 batch 推理；结果顺序与 image_paths 一致。
+    
     Args:
         image_paths: 图片路径列表
         confidence: 置信度阈值
-        progress_callback: 进度回调函数 (current, total)
+        progress_callback: 进度回调函数 (current, total)，与逐张检测时一样在每张图片开始处理前调用
+            （解码完成、进入推理批次时），不随批次成批触发
+        batch_size: 每次推理的图片数
+        workers: 解码线程数
+        queue_size: 预读队列的最大图片数
         
     Returns:
         检测结果列表
     """
     results = []
     total = len(image_paths)
+    batch = []
     
-    for i, path in enumerate(image_paths):
-        if progress_callback:
-            progress_callback(i + 1, total)
-        
+    def flush():
+        images = [image for _, image, error in batch if error is None]
         try:
-            result = detect_bird(path, confidence)
-            result["path"] = path
-            results.append(result)
+            records = iter(detect_bird_records(images, confidence))
+            batch_error = None
         except Exception as e:
-            results.append({
-                "path": path,
-                "has_bird": False,
-                "bird_count": 0,
-                "confidence": 0,
-                "error": str(e)
-            })
+            batch_error = e
+        
+        for path, image, error in batch:
+            error = error or (batch_error if image is not None else None)
+            if error is not None:
+                results.append(_error_result(path, error))
+            else:
+                result = next(records).to_dict()
+                result["path"] = path
+                results.append(result)
+        batch.clear()
+    
+    for i, item in enumerate(_decode_images(image_paths, workers, queue_size)):
+        if progress_callback:
+            progress_callback(i + 1, total)
+        batch.append(item)
+        if len(batch) >= max(1, batch_size):
+            flush()
+    if batch:
+        flush()
     
     return results
 
@@ -136,3 +685,97 @@ def batch_detect(image_paths: list[str], confidence: float = 0.3, progress_callb
 def filter_bird_frames(detection_results: list[dict]) -> list[dict]:
     """筛选出有鸟的帧"""
     return [r for r in detection_results if r.get("has_bird", False)]
+
+
+def scaling_benchmark(video_paths: list[str], max_jobs: int = None):
+    """依次用 1..max_jobs 个并行视频跑鸟类抽帧（不走检测索引），打印耗时与加速比"""
+    from modules.frame_sampler import extract_keyframes_with_bird_detection
+    
+    max_jobs = max_jobs or pool_size()
+    cores = os.cpu_count() or 1
+    print(f"CPU 核数: {cores}，视频数: {len(video_paths)}")
+    
+    baseline = None
+    for jobs in range(1, max_jobs + 1):
+        set_pool_size(jobs)
+        # 模型加载不计入耗时
+        with _model_lock:
+            while len(_models) < jobs:
+                _idle_models.put(_create_model())
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            def run(i, path):
+                return extract_keyframes_with_bird_detection(path, os.path.join(tmp, str(i)), use_index=False)
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                if baseline is None:
+                    run("warmup", video_paths[0])  # 预热解码器与缓存
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=jobs) as pool:
+                    list(pool.map(run, range(len(video_paths)), video_paths))
+            wall = time.perf_counter() - start
+        
+        baseline = baseline or wall
+        print(f"  并行 {jobs} 个视频（每实例 {torch_threads()} 线程）: {wall:.1f}s，"
+              f"{len(video_paths) / wall * 60:.1f} 视频/分钟，加速比 {baseline / wall:.2f}x")
+
+
+def latency_benchmark(clip_paths: list[str]):
+    """逐个短片段在新进程中跑鸟类抽帧（不走检测索引），对比每个片段的端到端耗时
+    
+    - 冷启动：不经守护进程，每个进程都要导入、加载模型后再解码和检测
+    - 守护进程：检测交给常驻的检测守护进程（守护进程在运行时），进程只负责解码
+    """
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ("import sys; from modules.frame_sampler import extract_keyframes_with_bird_detection; "
+            "extract_keyframes_with_bird_detection(sys.argv[1], sys.argv[2], use_index=False)")
+    
+    def run_clips(env) -> list[float]:
+        timings = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, path in enumerate(clip_paths):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, "-c", code, os.path.abspath(path), os.path.join(tmp, str(i))],
+                               cwd=project_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+                timings.append(time.perf_counter() - start)
+        return timings
+    
+    def report(label: str, timings: list[float]):
+        print(f"  {label}: 共 {sum(timings):.1f}s，每片段中位数 {statistics.median(timings):.2f}s，"
+              f"最慢 {max(timings):.2f}s")
+    
+    print(f"片段数: {len(clip_paths)}")
+    cold = run_clips(dict(os.environ, DETECT_DAEMON_SOCKET=""))
+    report("冷启动（每个进程加载模型）", cold)
+    
+    if daemon_model_id() is None:
+        print(f"  检测守护进程未运行，跳过（python -m modules.detection_server）")
+        return
+    via_daemon = run_clips(dict(os.environ))
+    report("经检测守护进程", via_daemon)
+    print(f"  加速比: {sum(cold) / sum(via_daemon):.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="鸟类检测工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("prefetch-models", help="下载并校验模型权重，生成融合模型缓存")
+    bench = sub.add_parser("bench", help="并行视频数扩展性测试")
+    bench.add_argument("videos", nargs="+", help="测试视频")
+    bench.add_argument("--max-jobs", type=int, help="最多并行视频数（默认为模型池大小）")
+    latency = sub.add_parser("latency", help="短片段逐个处理：冷启动与检测守护进程的耗时对比")
+    latency.add_argument("clips", nargs="+", help="测试片段（如 100 个短视频）")
+    args = parser.parse_args()
+    
+    if args.command == "prefetch-models":
+        for path in prefetch_models():
+            print(f"✓ {path}")
+        print(f"  SHA-256: {verify_weights(weights_path())}")
+    elif args.command == "latency":
+        latency_benchmark(args.clips)
+    else:
+        scaling_benchmark(args.videos, args.max_jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""检测索引模块 - 按视频内容哈希缓存 YOLO 鸟类检测结果（SQLite）"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DETECTION_INDEX_PATH
+
+# 内容哈希只读取文件头、中、尾各 1MB（加上文件大小），避免为几十 GB 的素材通读全文件
+_HASH_CHUNK = 1 << 20
+
+# 本进程内的缓存命中统计
+stats = {"hits": 0, "misses": 0}
+
+
+def video_content_hash(video_path: str) -> str:
+    """计算视频内容指纹（文件大小 + 头/中/尾采样块的 SHA-256）"""
+    size = os.path.getsize(video_path)
+    h = hashlib.sha256(str(size).encode())
+    with open(video_path, "rb") as f:
+        for offset in (0, max(0, size // 2 - _HASH_CHUNK // 2), max(0, size - _HASH_CHUNK)):
+            f.seek(offset)
+            h.update(f.read(_HASH_CHUNK))
+    return h.hexdigest()
+
+
+def make_key(video_hash: str, params: dict) -> str:
+    """索引键：视频指纹 + 采样/模型参数，任一参数变化都会得到新的键"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{video_hash}:{payload}".encode("utf-8")).hexdigest()
+
+
+def _connect(index_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS scans (
+            key TEXT PRIMARY KEY,
+            video_hash TEXT NOT NULL,
+            params TEXT NOT NULL,
+            checked_count INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS scans_video ON scans (video_hash);
+        CREATE TABLE IF NOT EXISTS detections (
+            key TEXT NOT NULL,
+            frame_idx INTEGER NOT NULL,
+            timestamp REAL NOT NULL,
+            confidence REAL NOT NULL,
+            bird_count INTEGER NOT NULL,
+            boxes TEXT NOT NULL,
+            PRIMARY KEY (key, frame_idx)
+        );
+    """)
+    return conn
+
+
+def load_detections(key: str, index_path: str = DETECTION_INDEX_PATH) -> dict:
+    """读取一次扫描的检测结果，未命中返回 None
+    
+    Returns:
+        {"checked_count": int, "detections": [{"frame_idx", "timestamp", "confidence", "bird_count", "boxes"}, ...]}
+    """
+    if not index_path or not os.path.exists(index_path):
+        stats["misses"] += 1
+        return None
+    
+    conn = _connect(index_path)
+    try:
+        row = conn.execute("SELECT checked_count FROM scans WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            stats["misses"] += 1
+            return None
+        
+        detections = [
+            {
+                "frame_idx": frame_idx,
+                "timestamp": timestamp,
+                "confidence": confidence,
+                "bird_count": bird_count,
+                "boxes": json.loads(boxes)
+            }
+            for frame_idx, timestamp, confidence, bird_count, boxes in conn.execute(
+                "SELECT frame_idx, timestamp, confidence, bird_count, boxes FROM detections "
+                "WHERE key = ? ORDER BY frame_idx", (key,)
+            )
+        ]
+    finally:
+        conn.close()
+    
+    stats["hits"] += 1
+    return {"checked_count": row[0], "detections": detections}
+
+
+def store_detections(
+    video_hash: str,
+    key: str,
+    params: dict,
+    checked_count: int,
+    detections: list[dict],
+    index_path: str = DETECTION_INDEX_PATH
+):
+    """保存一次完整扫描的检测结果；同一视频旧参数/旧模型下的记录一并清除"""
+    if not index_path:
+        return
+    
+    conn = _connect(index_path)
+    try:
+        with conn:
+            stale = [k for (k,) in conn.execute("SELECT key FROM scans WHERE video_hash = ?", (video_hash,))]
+            for old_key in stale:
+                conn.execute("DELETE FROM detections WHERE key = ?", (old_key,))
+            conn.execute("DELETE FROM scans WHERE video_hash = ?", (video_hash,))
+            
+            conn.execute(
+                "INSERT INTO scans (key, video_hash, params, checked_count, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, video_hash, json.dumps(params, sort_keys=True), checked_count, time.time())
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO detections (key, frame_idx, timestamp, confidence, bird_count, boxes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (key, d["frame_idx"], d["timestamp"], d["confidence"], d["bird_count"], json.dumps(d["boxes"]))
+                    for d in detections
+                ]
+            )
+    finally:
+        conn.close()
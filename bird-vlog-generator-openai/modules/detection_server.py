@@ -0,0 +1,70 @@
+"""检测守护进程 - 常驻 YOLO 模型，通过 Unix socket 为各个 CLI 进程提供批量检测
+
+启动（在项目目录下）：
+    python -m modules.detection_server
+
+运行期间 bird_detector 会自动把检测请求转发到这里，守护进程未启动时仍在本进程推理。
+socket 与随机口令文件放在当前用户私有的目录中（见 DETECT_DAEMON_SOCKET / DETECT_DAEMON_AUTHKEY_FILE）。
+"""
+
+import os
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, AuthenticationError
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DETECT_DAEMON_SOCKET
+from modules.bird_detector import model_id, warm_up, detect_local, daemon_authkey
+
+def _handle_connection(conn):
+    """处理一个客户端连接上的全部请求：("detect", sources, confidence) / ("ping",)"""
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            
+            try:
+                if request[0] == "ping":
+                    conn.send(("ok", model_id()))
+                elif request[0] == "detect":
+                    _, sources, confidence = request
+                    # 各连接从模型池借用实例，并发数由 DETECT_POOL_SIZE 决定
+                    results = detect_local(sources, confidence)
+                    conn.send(("ok", results))
+                else:
+                    conn.send(("error", f"未知请求: {request[0]}"))
+            except Exception as e:
+                conn.send(("error", str(e)))
+
+
+def serve(address: str = DETECT_DAEMON_SOCKET):
+    """启动检测守护进程（阻塞）"""
+    authkey = daemon_authkey(create=True)
+    start = time.perf_counter()
+    warm_up()
+    print(f"🐦 模型已加载: {model_id()}（{time.perf_counter() - start:.1f}s）")
+    
+    os.makedirs(os.path.dirname(address) or ".", mode=0o700, exist_ok=True)
+    if os.path.lexists(address):
+        os.unlink(address)
+    listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    os.chmod(address, 0o600)
+    print(f"🔌 检测守护进程监听中: {address}")
+    
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                continue
+            threading.Thread(target=_handle_connection, args=(conn,), daemon=True).start()
+    except KeyboardInterrupt:
+        print("\n已停止")
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    serve()
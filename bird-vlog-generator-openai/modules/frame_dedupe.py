@@ -0,0 +1,60 @@
+"""相似帧去重模块 - 用差值哈希（dHash）把几乎相同的关键帧归为一组，每组只做一次 AI 分析"""
+
+import os
+import sys
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ANALYSIS_DEDUPE_DISTANCE
+
+# 本进程内的去重统计（帧数 / 分组数）
+stats = {"frames": 0, "clusters": 0}
+
+
+def dhash(image_path: str) -> int:
+    """64 位差值哈希：缩成 9x8 灰度图，比较每行相邻像素的明暗，读取失败返回 None"""
+    image = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _hamming(hashes: np.ndarray, value: int) -> np.ndarray:
+    """hashes (uint64 数组) 与 value 的汉明距离"""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def cluster_frames(image_paths: list[str], max_distance: int = ANALYSIS_DEDUPE_DISTANCE, groups: list = None) -> list[int]:
+    """按出现顺序贪心聚类：与已有代表帧的 dHash 汉明距离不超过 max_distance 的归入该组
+    
+    dHash 对只占画面一小块的鸟不敏感，groups（如每帧检测到的鸟数）不同的帧不会归为一组。
+    
+    Returns:
+        与 image_paths 一一对应的代表帧下标（代表帧指向自己）；无法读取的图片各自成组
+    """
+    if groups is None:
+        groups = [None] * len(image_paths)
+    
+    rep_of = []
+    reps = {}  # group -> (代表帧下标列表, dHash 数组)
+    
+    for i, (path, group) in enumerate(zip(image_paths, groups)):
+        value = dhash(path)
+        rep_indices, rep_hashes = reps.get(group, ([], np.zeros(0, dtype=np.uint64)))
+        if value is not None and rep_indices:
+            distances = _hamming(rep_hashes, value)
+            nearest = int(distances.argmin())
+            if distances[nearest] <= max_distance:
+                rep_of.append(rep_indices[nearest])
+                continue
+        
+        rep_of.append(i)
+        if value is not None:
+            reps[group] = (rep_indices + [i], np.append(rep_hashes, np.uint64(value)))
+    
+    stats["frames"] += len(image_paths)
+    stats["clusters"] += len(set(rep_of))
+    return rep_of
@@ -1,18 +1,59 @@
-"""关键帧提取模块 - 带 YOLO 鸟类检测"""
+"""关键帧提取模块 - 带 YOLO 鸟类检测
 
+采样解码方式对比（seek/grab/linear 的耗时，以及解出的帧是否与逐帧解码一致）：
+    python -m modules.frame_sampler bench-sampling 视频1.mp4 ... [--interval 秒] [--modes seek grab linear]
+
+鸟类抽帧的 YOLO 批大小对比（串行解码，报告每 CPU 秒检查的帧数）：
+    python -m modules.frame_sampler bench-batch 视频1.mp4 ... [--sizes 1 4 8 16] [--interval 秒]
+"""
+
+import argparse
+import bisect
+import contextlib
 import cv2
+import heapq
+import io
+import itertools
 import os
+import queue
+import re
+import subprocess
 import sys
+import threading
+import time
+import zlib
+from array import array
 import numpy as np
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import FRAME_SAMPLE_INTERVAL, MAX_FRAMES_PER_VIDEO
+from config import (
+    FRAME_SAMPLE_INTERVAL, MAX_FRAMES_PER_VIDEO, FRAME_SEEK_MODE, SMART_ANALYSIS_WIDTH, DETECT_BATCH_SIZE,
+    DETECT_PIPELINE, DETECT_QUEUE_SIZE, KEYFRAME_SCAN_WIDTH, SMART_ENGINE, BIRD_REFINE,
+    DETECT_BUDGET, DETECT_TARGET_CONFIDENCE, MOTION_GATE, MOTION_GATE_THRESHOLD, MOTION_GATE_MAX_SKIP,
+    DETECT_TILE_MODE, DETECT_TILE_SIZE
+)
+
+# 目标帧与当前位置相差不超过该帧数时用 grab() 前进，比跳转（回到上一个关键帧再解码）更便宜
+SEEK_GRAB_WINDOW = 30
+
+# 运动门控的分析宽度，以及判定像素"有变化"的灰度差
+MOTION_ANALYSIS_WIDTH = 160
+MOTION_PIXEL_DELTA = 25
+
+# 清晰度在原分辨率上估计：均匀取 SHARPNESS_GRID×SHARPNESS_GRID 个 SHARPNESS_PATCH 见方的小块
+# （缩小后的代理图看不出几个像素的模糊，阈值和权重也是按原分辨率的拉普拉斯方差定的）
+SHARPNESS_PATCH = 128
+SHARPNESS_GRID = 3
+# smart 模式每块灰度帧的像素总数上限（原始分辨率分析时自动减小块大小，限制内存）
+SMART_BLOCK_MAX_PIXELS = 16 * 1920 * 1080
 
 
 def extract_keyframes(
     video_path: str,
     output_dir: str,
     method: str = "bird_detect",
-    max_frames: int = 3  # 每个视频最多 3 帧（参考 Reli 方案）
+    max_frames: int = 3,  # 每个视频最多 3 帧（参考 Reli 方案）
+    sampling: str = None,
+    engine: str = None
 ) -> list[dict]:
     """从视频中提取关键帧
     
@@ -23,23 +64,201 @@ def extract_keyframes(
             - "simple": 等间隔抽帧
             - "smart": 场景变化+运动检测
             - "bird_detect": YOLO 鸟类检测（推荐）
+            - "keyframes": 只解码 I 帧的快速鸟类初筛（ffmpeg 管道，不保证等间隔）
         max_frames: 最大帧数
+        sampling: 采样解码方式（默认使用配置 FRAME_SEEK_MODE）
+            - "seek": 直接跳转到目标帧，只解码需要检查的帧（推荐）
+            - "grab": 用 grab() 跳过中间帧，适合跳转不可靠的容器
+            - "linear": 逐帧解码（旧行为）
+        engine: smart 模式的候选检测引擎（默认使用配置 SMART_ENGINE）
+            - "opencv": Python 中逐块计算场景/运动/清晰度得分
+            - "ffmpeg": 由 ffmpeg 的 scene 滤镜给出候选时间戳，只解码入选帧
         
     Returns:
         关键帧信息列表 [{"path": str, "timestamp": float, "video_path": str, ...}, ...]
     """
     if max_frames is None:
         max_frames = MAX_FRAMES_PER_VIDEO
+    if sampling is None:
+        sampling = FRAME_SEEK_MODE
+    if engine is None:
+        engine = SMART_ENGINE
     
     if method == "simple":
-        return extract_keyframes_simple(video_path, output_dir, max_frames)
+        return extract_keyframes_simple(video_path, output_dir, max_frames, sampling=sampling)
     elif method == "smart":
-        return extract_keyframes_smart(video_path, output_dir, max_frames)
+        return extract_keyframes_smart(video_path, output_dir, max_frames, engine=engine)
+    elif method == "keyframes":
+        return extract_keyframes_iframes(video_path, output_dir, max_frames)
     else:
-        return extract_keyframes_with_bird_detection(video_path, output_dir, max_frames)
+        return extract_keyframes_with_bird_detection(video_path, output_dir, max_frames, sampling=sampling)
+
+
+def _can_seek(cap) -> bool:
+    """探测容器是否支持按帧号精确跳转"""
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    probe = total_frames // 2
+    if probe <= 0:
+        return False
+    
+    ok = cap.set(cv2.CAP_PROP_POS_FRAMES, probe) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == probe
+    # 无论探测结果如何都要回到开头
+    ok = cap.set(cv2.CAP_PROP_POS_FRAMES, 0) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == 0 and ok
+    return ok
+
+
+def iter_sampled_frames(cap, frame_indices, mode: str = "seek"):
+    """按帧号迭代采样帧，只解码真正需要检查的帧
+    
+    Args:
+        cap: 已打开的 cv2.VideoCapture（位置在开头）
+        frame_indices: 目标帧号序列；grab/linear 模式下遇到回退会从头重新解码，应尽量递增
+        mode: "seek" / "grab" / "linear"，seek 不可靠时自动回退到 grab
+        
+    seek 模式下读不到的目标（CAP_PROP_FRAME_COUNT 只是估计值，可能超出实际结尾）直接跳过，
+    继续处理后面的目标（按位反转等非递增顺序时后面仍可能有有效帧）；
+    grab/linear 模式读不到即视为视频结束。
+        
+    Yields:
+        (frame_idx, frame)
+    """
+    if mode == "seek" and not _can_seek(cap):
+        print(f"  ⚠️ 视频不支持精确跳转，回退到 grab 模式")
+        mode = "grab"
+    
+    pos = 0  # 下一次 read()/grab() 返回的帧号，None 表示读取失败后位置未知
+    for target in frame_indices:
+        if mode == "seek" and (pos is None or not 0 <= target - pos <= SEEK_GRAB_WINDOW):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            pos = target
+        elif target < pos:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            pos = 0
+        
+        ok = True
+        while ok and pos < target:
+            ok = cap.read()[0] if mode == "linear" else cap.grab()
+            pos += 1
+        if ok:
+            ok, frame = cap.read()
+            pos += 1
+        
+        if not ok:
+            if mode != "seek":
+                return
+            pos = None
+            continue
+        yield target, frame
+
+
+def _iter_batches(iterable, batch_size: int):
+    """把迭代器按 batch_size 分组，最后一组可能不满"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, max(1, batch_size)))
+        if not batch:
+            return
+        yield batch
+
+
+_PREFETCH_DONE = object()
 
 
-def extract_keyframes_simple(video_path: str, output_dir: str, max_frames: int = 20) -> list[dict]:
+def prefetch_iter(iterable, maxsize: int = 16):
+    """在后台线程中提前消费迭代器（如视频解码），与调用方的处理（如 YOLO）并行
+    
+    队列有界：处理跟不上时生产线程会阻塞，内存中最多排队 maxsize 个元素。
+    生产线程中的异常会在调用方重新抛出；调用方提前退出时生产线程随之停止。
+    """
+    q = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+    
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def producer():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_PREFETCH_DONE, None))
+        except Exception as e:
+            put((_PREFETCH_DONE, e))
+    
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is _PREFETCH_DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _sample_indices(total_frames: int, frame_interval: int):
+    """等间隔采样帧号；帧数未知时一直采到视频结束"""
+    if total_frames > 0:
+        return range(0, total_frames, frame_interval)
+    return itertools.count(0, frame_interval)
+
+
+def push_top_k(heap: list, k: int, score: float, seq: int, make_item) -> bool:
+    """流式 Top-K：堆中最多保留 k 个得分最高的候选
+    
+    与「按得分降序稳定排序后取前 k 个」的结果一致：同分时先出现（seq 小）的优先。
+    make_item 只在候选真正入选时才调用，避免为被淘汰的帧复制整幅画面。
+    
+    Returns:
+        是否入选
+    """
+    key = (score, -seq)
+    if len(heap) < k:
+        heapq.heappush(heap, (key, make_item()))
+        return True
+    if k > 0 and key > heap[0][0]:
+        heapq.heapreplace(heap, (key, make_item()))
+        return True
+    return False
+
+
+def stratified_order(n: int):
+    """按位反转（van der Corput）顺序遍历 0..n-1：先粗后细，任意前缀在时间上都分布均匀"""
+    if n <= 0:
+        return
+    bits = max(1, (n - 1).bit_length())
+    for i in range(1 << bits):
+        r = int(format(i, f"0{bits}b")[::-1], 2)
+        if r < n:
+            yield r
+
+
+def _print_timing(wall: float, cpu: float, duration: float):
+    """打印采样耗时（含每小时素材的折算）"""
+    hours = duration / 3600
+    if hours > 0:
+        print(f"  ⏱️ 采样耗时: {wall:.1f}s 墙钟 / {cpu:.1f}s CPU"
+              f"（每小时素材 {wall / hours:.1f}s / {cpu / hours:.1f}s）")
+    else:
+        print(f"  ⏱️ 采样耗时: {wall:.1f}s 墙钟 / {cpu:.1f}s CPU")
+
+
+def extract_keyframes_simple(
+    video_path: str,
+    output_dir: str,
+    max_frames: int = 20,
+    sampling: str = FRAME_SEEK_MODE
+) -> list[dict]:
     """简单等间隔抽帧"""
     os.makedirs(output_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
@@ -58,48 +277,286 @@ def extract_keyframes_simple(video_path: str, output_dir: str, max_frames: int =
         frame_interval = 30
     
     frame_infos = []
-    frame_count = 0
-    saved_count = 0
+    indices = itertools.islice(_sample_indices(total_frames, frame_interval), max_frames)
     
-    while cap.isOpened() and saved_count < max_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    for saved_count, (frame_count, frame) in enumerate(iter_sampled_frames(cap, indices, sampling)):
+        timestamp = frame_count / fps
+        path = os.path.join(output_dir, f"frame_{saved_count:04d}_t{int(timestamp)}.jpg")
+        cv2.imwrite(path, frame)
+        frame_infos.append({
+            "path": path,
+            "timestamp": timestamp,
+            "video_path": video_path,
+            "frame_index": saved_count
+        })
+    
+    cap.release()
+    return frame_infos
+
+
+class MotionGate:
+    """运动门控：与上一次推理的帧相比画面几乎没变化时跳过 YOLO，沿用上一次的检测结果
+    
+    - diff: 低分辨率灰度帧差，变化像素占比低于 threshold 视为没变
+    - mog2: 同样与上一次推理的帧做帧差，但只统计 MOG2 当前或上一次推理时判为前景的像素，
+      光线抖动、树叶晃动等背景噪声不计入；鸟离开后露出的背景仍落在上一次的前景掩码里，
+      会触发重新推理（MOG2 会很快把停着不动的鸟学进背景，不能只看当前前景）
+    连续跳过 max_skip 帧后强制推理一次，避免缓慢变化（光线、慢慢走进画面的鸟）一直被忽略。
+    """
+    
+    def __init__(self, method: str = "diff", threshold: float = MOTION_GATE_THRESHOLD,
+                 max_skip: int = MOTION_GATE_MAX_SKIP):
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"未知的运动门控方式: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.checked = 0
+        self.skipped = 0
+        self._reference = None  # 上一次推理的帧
+        self._reference_mask = None  # 上一次推理时的前景掩码（mog2）
+        self._mask = None
+        self._run = 0  # 当前连续跳过的帧数
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == "mog2" else None
+    
+    def _changed_fraction(self, small) -> float:
+        if self._subtractor is not None:
+            self._mask = self._subtractor.apply(small) > 0
+        if self._reference is None:
+            return 1.0
+        moved = cv2.absdiff(small, self._reference) > MOTION_PIXEL_DELTA
+        if self._subtractor is not None:
+            moved &= self._mask | self._reference_mask
+        return np.count_nonzero(moved) / small.size
+    
+    def should_detect(self, frame) -> bool:
+        """判断这一帧是否需要推理"""
+        self.checked += 1
+        small = cv2.GaussianBlur(_analysis_proxy(frame, MOTION_ANALYSIS_WIDTH), (5, 5), 0)
+        changed = self._changed_fraction(small)
         
-        if frame_count % frame_interval == 0:
-            timestamp = frame_count / fps
-            path = os.path.join(output_dir, f"frame_{saved_count:04d}_t{int(timestamp)}.jpg")
-            cv2.imwrite(path, frame)
-            frame_infos.append({
-                "path": path,
-                "timestamp": timestamp,
-                "video_path": video_path,
-                "frame_index": saved_count
-            })
-            saved_count += 1
+        if self._reference is None or changed >= self.threshold or self._run >= self.max_skip:
+            self._reference = small
+            self._reference_mask = self._mask
+            self._run = 0
+            return True
         
-        frame_count += 1
+        self._run += 1
+        self.skipped += 1
+        return False
     
-    cap.release()
+    @property
+    def skip_ratio(self) -> float:
+        return self.skipped / self.checked if self.checked else 0.0
+
+
+def _detect_sampled_frames(
+    cap,
+    frame_indices,
+    confidence: float,
+    sampling: str,
+    batch_size: int,
+    pipelined: bool,
+    gate: MotionGate = None,
+    tile_mode: str = "off"
+):
+    """解码指定帧并批量做 YOLO 检测
+    
+    gate 判定画面没变化的帧不推理，沿用上一个推理帧的结果。
+    tile_mode 不为 off 时逐帧做切片检测（motion 模式以上一个推理帧为参照找运动区域）。
+    
+    Yields:
+        (frame_idx, frame, result)
+    """
+    from modules.bird_detector import detect_bird_records, detect_tiled_records
+    
+    sampled = iter_sampled_frames(cap, frame_indices, sampling)
+    if pipelined:
+        sampled = prefetch_iter(sampled, DETECT_QUEUE_SIZE)
+    
+    previous = None
+    
+    def detect(frames):
+        nonlocal previous
+        if tile_mode in (None, "", "off"):
+            return detect_bird_records(frames, confidence=confidence)
+        results = []
+        for frame in frames:
+            results.append(detect_tiled_records(frame, previous, confidence, tile_mode))
+            previous = frame
+        return results
+    
+    if gate is None:
+        for batch in _iter_batches(sampled, batch_size):
+            results = detect([frame for _, frame in batch])
+            for (frame_idx, frame), result in zip(batch, results):
+                yield frame_idx, frame, result
+        return
+    
+    # 每攒够 batch_size 帧（含跳过的帧，保证内存中的画面数有上限）就检测其中需要推理的帧，
+    # 跳过的帧按顺序沿用前一个结果
+    last_result = None
+    pending = []  # [(frame_idx, frame, 是否推理)]
+    
+    def flush():
+        nonlocal last_result
+        results = iter(detect([frame for _, frame, inspect in pending if inspect]))
+        for frame_idx, frame, inspect in pending:
+            if inspect:
+                last_result = next(results)
+            yield frame_idx, frame, last_result
+        pending.clear()
+    
+    for frame_idx, frame in sampled:
+        pending.append((frame_idx, frame, gate.should_detect(frame)))
+        if len(pending) >= batch_size:
+            yield from flush()
+    if pending:
+        yield from flush()
+
+
+def _save_bird_frames(video_path: str, output_dir: str, selected: list[dict], sampling: str) -> list[dict]:
+    """保存选中的帧；候选中没有画面的（如来自检测索引）按帧号重新解码"""
+    missing = [cand["frame_idx"] for cand in selected if cand.get("frame") is None]
+    decoded = {}
+    if missing:
+        cap = cv2.VideoCapture(video_path)
+        decoded = dict(iter_sampled_frames(cap, missing, sampling))
+        cap.release()
+    
+    frame_infos = []
+    for cand in selected:
+        frame = cand.get("frame")
+        if frame is None:
+            frame = decoded.get(cand["frame_idx"])
+        if frame is None:
+            continue
+        i = len(frame_infos)
+        path = os.path.join(output_dir, f"frame_{i:04d}_t{int(cand['timestamp'])}.jpg")
+        cv2.imwrite(path, frame)
+        frame_infos.append({
+            "path": path,
+            "timestamp": cand["timestamp"],
+            "video_path": video_path,
+            "frame_index": i,
+            "bird_confidence": cand["confidence"],
+            "bird_count": cand["bird_count"],
+            "bird_boxes": cand.get("boxes", [])
+        })
     return frame_infos
 
 
+def _sharpness(frame) -> float:
+    """清晰度：原分辨率小块的拉普拉斯方差"""
+    return float(laplacian_variance(sharpness_patches(frame)[None])[0])
+
+
+def _refine_around_hits(
+    cap,
+    fps: float,
+    hits: list[dict],
+    confidence: float,
+    sampling: str,
+    batch_size: int,
+    refine_window: float,
+    refine_step: float,
+    tile_mode: str = "off"
+) -> tuple[list[dict], int]:
+    """在粗扫命中点附近细扫，每个窗口取 置信度 × 清晰度 最高的一帧
+    
+    Args:
+        hits: 粗扫选中的候选（含 frame_idx）
+        refine_window: 细扫半径（秒）
+        refine_step: 细扫步长（秒）
+        
+    Returns:
+        (细化后的候选列表, 细扫推理次数)
+    """
+    step = max(1, int(round(fps * refine_step)))
+    steps = int(fps * refine_window) // step
+    
+    # 帧号 -> 所属窗口（窗口重叠时归最近的命中点）
+    owner = {}
+    for w, hit in enumerate(hits):
+        for k in range(-steps, steps + 1):
+            idx = hit["frame_idx"] + k * step
+            if idx < 0:
+                continue
+            if idx not in owner or abs(idx - hit["frame_idx"]) < abs(idx - hits[owner[idx]]["frame_idx"]):
+                owner[idx] = w
+    
+    best = [None] * len(hits)  # 每个窗口当前最佳 (score, candidate)
+    inferences = 0
+    for frame_idx, frame, result in _detect_sampled_frames(
+        cap, sorted(owner), confidence, sampling, batch_size, pipelined=False, tile_mode=tile_mode
+    ):
+        inferences += 1
+        if not result.has_bird:
+            continue
+        w = owner[frame_idx]
+        score = result.confidence * _sharpness(frame)
+        if best[w] is None or score > best[w][0]:
+            best[w] = (score, {
+                "frame_idx": frame_idx,
+                "timestamp": frame_idx / fps,
+                "frame": frame,
+                "confidence": result.confidence,
+                "bird_count": result.bird_count,
+                "boxes": result.box_list()
+            })
+    
+    refined = [b[1] if b is not None else hit for hit, b in zip(hits, best)]
+    return refined, inferences
+
+
 def extract_keyframes_with_bird_detection(
     video_path: str,
     output_dir: str,
     max_frames: int = 20,
     sample_interval: float = 5.0,  # 每 5 秒检测一次
-    confidence: float = 0.25
+    confidence: float = 0.25,
+    sampling: str = FRAME_SEEK_MODE,
+    batch_size: int = DETECT_BATCH_SIZE,
+    pipelined: bool = DETECT_PIPELINE,
+    use_index: bool = True,
+    refine: bool = BIRD_REFINE,
+    refine_window: float = 2.0,
+    refine_step: float = 0.5,
+    budget: int = DETECT_BUDGET,
+    target_confidence: float = DETECT_TARGET_CONFIDENCE,
+    min_coverage: float = 0.25,
+    motion_gate: str = MOTION_GATE,
+    tile_mode: str = DETECT_TILE_MODE
 ) -> list[dict]:
     """使用 YOLO 检测鸟类，只保留有鸟的帧
     
     流程：
     1. 每 sample_interval 秒取一帧
-    2. 用 YOLO 检测是否有鸟
+    2. 每攒够 batch_size 帧用 YOLO 批量检测是否有鸟
+       （pipelined 时解码在后台线程进行，经有界队列交给检测）
     3. 只保留有鸟的帧
     4. 如果有鸟的帧超过 max_frames，按置信度排序取 top
+       （流式 Top-K，内存中最多只保留 max_frames 幅全分辨率画面）
+    
+    use_index 时检测结果按视频内容哈希 + 参数缓存在检测索引中，
+    命中后不再跑 YOLO，只解码最终选中的帧。
+    
+    refine 时在粗扫选中的每个命中点 ±refine_window 秒内按 refine_step 细扫，
+    取 置信度 × 清晰度 最高的一帧，用较少的推理次数得到比均匀密扫更好的画面。
+    
+    设置 budget（最多推理次数）或 target_confidence 时改为预算扫描：采样点按位反转顺序
+    先粗后细地访问，推理次数达到 budget，或已扫过 min_coverage 比例的采样点且
+    top max_frames 的置信度都不低于 target_confidence 时提前结束。
+    视频不可跳转时按位反转顺序会反复从头解码，改为一次顺序扫描：预算折算成采样步长，
+    不做提前结束（顺序扫描的前缀只覆盖视频开头）。
+    
+    motion_gate 为 diff/mog2 时，与上一个推理帧相比画面没变化的采样帧不跑 YOLO，
+    沿用上一个结果（适合固定机位、大部分时间静止的喂食器画面）。
+    
+    tile_mode 为 motion/full 时在整帧之外再对运动区域/整帧切片检测，找 4K 远景中的小鸟。
     """
-    from modules.bird_detector import detect_bird_in_frame
+    from modules import detection_index
+    from modules.bird_detector import model_id, tile_stats
     
     os.makedirs(output_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
@@ -117,75 +574,205 @@ def extract_keyframes_with_bird_detection(
     if frame_interval <= 0:
         frame_interval = int(fps * 5)
     
-    # 收集所有候选帧
-    candidates = []  # [(frame_idx, timestamp, frame, confidence, bird_count)]
-    frame_count = 0
-    checked_count = 0
+    # 只保留置信度最高的 max_frames 个候选帧（最小堆）
+    top_heap = []  # [((confidence, -frame_idx), candidate)]
     
-    print(f"  🔍 YOLO 鸟类检测中...")
+    budgeted = bool(budget or target_confidence) and total_frames > 0
+    stratified = budgeted and _can_seek(cap)
+    gated = motion_gate not in (None, "", "off")
+    tiled = tile_mode not in (None, "", "off")
+    if budgeted:
+        num_points = (total_frames + frame_interval - 1) // frame_interval
+        min_checked = int(num_points * min_coverage)
+    if stratified:
+        indices = (k * frame_interval for k in stratified_order(num_points))
+        if budget:
+            indices = itertools.islice(indices, budget)
+    elif budgeted:
+        print(f"  ⚠️ 视频不支持精确跳转，预算扫描改为按步长顺序扫描")
+        stride = -(-num_points // budget) if budget else 1
+        indices = range(0, total_frames, frame_interval * stride)
+    else:
+        indices = _sample_indices(total_frames, frame_interval)
     
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    cached = None
+    if use_index:
+        video_hash = detection_index.video_content_hash(video_path)
+        index_params = {
+            "sampler": "stratified" if stratified else "strided" if budgeted else "uniform",
+            "frame_interval": frame_interval,
+            "confidence": confidence,
+            "model": model_id()
+        }
+        if budgeted:
+            index_params.update(budget=budget, target_confidence=target_confidence, min_coverage=min_coverage)
+        if gated:
+            index_params.update(motion_gate=motion_gate, motion_threshold=MOTION_GATE_THRESHOLD,
+                                motion_max_skip=MOTION_GATE_MAX_SKIP)
+        if tiled:
+            index_params.update(tile_mode=tile_mode, tile_size=DETECT_TILE_SIZE)
+        index_key = detection_index.make_key(video_hash, index_params)
+        cached = detection_index.load_detections(index_key)
+        print(f"  检测索引: {'命中' if cached else '未命中'}"
+              f"（累计命中 {detection_index.stats['hits']} / 未命中 {detection_index.stats['misses']}）")
+    
+    inferences = 0
+    if cached:
+        checked_count = cached["checked_count"]
+        detections = cached["detections"]
+        for det in detections:
+            push_top_k(top_heap, max_frames, det["confidence"], det["frame_idx"], lambda: dict(det))
+    else:
+        checked_count = 0
+        detections = []
+        
+        print(f"  🔍 YOLO 鸟类检测中{'（预算扫描）' if budgeted else ''}...")
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        
+        if stratified and sampling != "seek":
+            print(f"  ⚠️ 预算扫描需要跳转，sampling 改为 seek")
+            sampling = "seek"
+        elif budgeted and sampling == "seek":
+            sampling = "grab"
         
-        if frame_count % frame_interval == 0:
+        gate = MotionGate(motion_gate) if gated else None
+        tiles_before = tile_stats["tiles"]
+        scan = _detect_sampled_frames(cap, indices, confidence, sampling, batch_size, pipelined, gate, tile_mode)
+        for frame_count, frame, result in scan:
             checked_count += 1
-            timestamp = frame_count / fps
-            
-            # YOLO 检测
-            result = detect_bird_in_frame(frame, confidence=confidence)
-            
-            if result["has_bird"]:
-                candidates.append({
+            if result.has_bird:
+                det = {
                     "frame_idx": frame_count,
-                    "timestamp": timestamp,
-                    "frame": frame.copy(),
-                    "confidence": result["confidence"],
-                    "bird_count": result["bird_count"]
-                })
-                print(f"    ✓ 发现鸟类 @ {timestamp:.1f}s (置信度: {result['confidence']:.2f})", end="\r")
+                    "timestamp": frame_count / fps,
+                    "confidence": result.confidence,
+                    "bird_count": result.bird_count,
+                    "boxes": result.box_list()
+                }
+                detections.append(det)
+                push_top_k(top_heap, max_frames, det["confidence"], frame_count, lambda: dict(det, frame=frame))
+                print(f"    ✓ 发现鸟类 @ {det['timestamp']:.1f}s (置信度: {det['confidence']:.2f})", end="\r")
+            
+            if (stratified and target_confidence and checked_count >= min_checked
+                    and len(top_heap) >= max_frames and top_heap[0][0][0] >= target_confidence):
+                print(f"\n  ✓ 已达到置信度目标，提前结束（覆盖 {checked_count}/{num_points} 个采样点）")
+                break
+        scan.close()
         
-        frame_count += 1
-    
-    cap.release()
-    print()
+        inferences = checked_count
+        print()
+        if gate is not None:
+            inferences -= gate.skipped
+            print(f"  运动门控（{motion_gate}）: 跳过 {gate.skipped}/{gate.checked} 帧推理（{gate.skip_ratio:.0%}）")
+        if tiled:
+            print(f"  切片检测（{tile_mode}）: 额外推理 {tile_stats['tiles'] - tiles_before} 个切片")
+        wall = time.perf_counter() - wall_start
+        _print_timing(wall, time.process_time() - cpu_start, duration)
+        if wall > 0:
+            mode = "流水线" if pipelined else "串行"
+            print(f"  检测吞吐: {checked_count / wall:.1f} 帧/秒（batch={batch_size}, {mode}）")
+        
+        if use_index:
+            detection_index.store_detections(video_hash, index_key, index_params, checked_count, detections)
     
-    print(f"  检查了 {checked_count} 帧，发现 {len(candidates)} 帧有鸟")
+    print(f"  检查了 {checked_count} 帧，发现 {len(detections)} 帧有鸟")
     
     # 如果没有检测到鸟，回退到等间隔抽帧
-    if not candidates:
+    if not top_heap:
+        cap.release()
         print(f"  未检测到鸟类，使用等间隔抽帧...")
-        return extract_keyframes_simple(video_path, output_dir, max_frames)
+        return extract_keyframes_simple(video_path, output_dir, max_frames, sampling=sampling)
     
-    # 按置信度排序，取 top max_frames
-    candidates.sort(key=lambda x: x["confidence"], reverse=True)
-    selected = candidates[:max_frames]
-    
-    # 按时间顺序排序
+    # 堆中即为置信度 top max_frames，按时间顺序排序
+    selected = [cand for _, cand in top_heap]
     selected.sort(key=lambda x: x["timestamp"])
     
-    # 保存帧
-    frame_infos = []
-    for i, cand in enumerate(selected):
-        path = os.path.join(output_dir, f"frame_{i:04d}_t{int(cand['timestamp'])}.jpg")
-        cv2.imwrite(path, cand["frame"])
-        frame_infos.append({
-            "path": path,
-            "timestamp": cand["timestamp"],
-            "video_path": video_path,
-            "frame_index": i,
-            "bird_confidence": cand["confidence"],
-            "bird_count": cand["bird_count"]
-        })
+    if refine:
+        print(f"  🔎 命中点附近细扫（±{refine_window}s，步长 {refine_step}s）...")
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+        selected, refine_inferences = _refine_around_hits(
+            cap, fps, selected, confidence, sampling, batch_size, refine_window, refine_step, tile_mode
+        )
+        inferences += refine_inferences
+    cap.release()
+    
+    frame_infos = _save_bird_frames(video_path, output_dir, selected, sampling)
     
     print(f"  ✓ 最终选择 {len(frame_infos)} 帧（有鸟）")
+    if frame_infos:
+        print(f"  推理次数: {inferences}（每入选帧 {inferences / len(frame_infos):.1f} 次）")
     
     return frame_infos
 
 
-def extract_keyframes_smart(video_path: str, output_dir: str, max_frames: int = 20) -> list[dict]:
-    """智能关键帧提取：场景变化+运动检测"""
+_SHOWINFO_PTS = re.compile(r"\bpts_time:\s*(-?[\d.]+(?:e[-+]?\d+)?)")
+
+
+def iter_ffmpeg_keyframes(video_path: str, width: int, height: int):
+    """用 ffmpeg 只解码关键帧（-skip_frame nokey），缩放后以原始 BGR 流经管道读出
+    
+    时间戳来自 showinfo 滤镜在 stderr 上的输出，由后台线程解析。
+    
+    Yields:
+        (timestamp, frame)，frame 是直接建立在读出缓冲区上的只读数组（无拷贝）
+    """
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-nostats', '-loglevel', 'info',
+        '-skip_frame', 'nokey',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f'showinfo,scale={width}:{height}',
+        '-vsync', '0',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+        'pipe:1'
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timestamps = queue.Queue()
+    
+    def read_timestamps():
+        for line in proc.stderr:
+            if b"Parsed_showinfo" in line:
+                match = _SHOWINFO_PTS.search(line.decode("utf-8", "replace"))
+                if match:
+                    timestamps.put(float(match.group(1)))
+        timestamps.put(None)
+    
+    reader = threading.Thread(target=read_timestamps, daemon=True)
+    reader.start()
+    
+    frame_size = width * height * 3
+    try:
+        while True:
+            buf = proc.stdout.read(frame_size)
+            if len(buf) < frame_size:
+                break
+            timestamp = timestamps.get()
+            if timestamp is None:
+                break
+            yield timestamp, np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        reader.join()
+
+
+def extract_keyframes_iframes(
+    video_path: str,
+    output_dir: str,
+    max_frames: int = 20,
+    confidence: float = 0.25,
+    scan_width: int = KEYFRAME_SCAN_WIDTH,
+    batch_size: int = DETECT_BATCH_SIZE
+) -> list[dict]:
+    """关键帧（I 帧）快速初筛：只解码 I 帧做 YOLO 检测，选中的帧再按原分辨率取出
+    
+    不保证等间隔，适合「这个文件里有没有鸟」的第一遍扫描；
+    长 GOP 的相机素材上比 cv2.VideoCapture 全解码快一个数量级。
+    """
+    from modules.bird_detector import detect_bird_records
+    
     os.makedirs(output_dir, exist_ok=True)
     cap = cv2.VideoCapture(video_path)
     
@@ -194,59 +781,298 @@ def extract_keyframes_smart(video_path: str, output_dir: str, max_frames: int =
     
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    src_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    src_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
     duration = total_frames / fps if fps > 0 else 0
+    cap.release()
     
     print(f"  视频信息: {duration:.1f}秒, {fps:.1f}fps, {total_frames}帧")
     
-    min_frame_gap = int(fps * 3)
-    scene_threshold = 0.15
-    motion_threshold = 5
-    blur_threshold = 50
+    width = min(scan_width, src_width) if scan_width else src_width
+    width -= width % 2
+    height = max(2, round(src_height * width / src_width / 2) * 2)
+    
+    top_heap = []  # [((confidence, -seq), candidate)]
+    checked_count = 0
+    bird_count_total = 0
+    
+    print(f"  🔍 I 帧鸟类初筛中（{width}x{height}）...")
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    
+    for batch in _iter_batches(iter_ffmpeg_keyframes(video_path, width, height), batch_size):
+        results = detect_bird_records([frame for _, frame in batch], confidence=confidence)
+        
+        for (timestamp, _), result in zip(batch, results):
+            seq = checked_count
+            checked_count += 1
+            if not result.has_bird:
+                continue
+            bird_count_total += 1
+            push_top_k(top_heap, max_frames, result.confidence, seq, lambda: {
+                "frame_idx": int(round(timestamp * fps)),
+                "timestamp": timestamp,
+                "confidence": result.confidence,
+                "bird_count": result.bird_count
+            })
+    
+    _print_timing(time.perf_counter() - wall_start, time.process_time() - cpu_start, duration)
+    print(f"  检查了 {checked_count} 个 I 帧，发现 {bird_count_total} 帧有鸟")
+    
+    if not top_heap:
+        print(f"  未检测到鸟类，使用等间隔抽帧...")
+        return extract_keyframes_simple(video_path, output_dir, max_frames)
+    
+    selected = sorted((cand for _, cand in top_heap), key=lambda x: x["timestamp"])
+    
+    # 选中的帧按原分辨率解码（I 帧跳转代价很低）
+    frame_infos = _save_bird_frames(video_path, output_dir, selected, "seek")
+    
+    print(f"  ✓ 最终选择 {len(frame_infos)} 帧（有鸟）")
     
-    candidates = []
-    prev_frame = None
+    return frame_infos
+
+
+def _analysis_proxy(frame, analysis_width: int = None):
+    """生成用于评分的灰度代理图（宽度超过 analysis_width 时先缩小）"""
+    height, width = frame.shape[:2]
+    if analysis_width and width > analysis_width:
+        size = (analysis_width, max(1, round(height * analysis_width / width)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def sharpness_patches(frame):
+    """从原分辨率画面中均匀取 SHARPNESS_GRID×SHARPNESS_GRID 个灰度小块（各带 1 像素边框）
+    
+    画面不够大时直接用整幅灰度图。
+    
+    Returns:
+        (P, H, W) uint8
+    """
+    height, width = frame.shape[:2]
+    size = SHARPNESS_PATCH + 2
+    if height < size * SHARPNESS_GRID or width < size * SHARPNESS_GRID:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)[None]
+    ys = np.linspace(0, height - size, SHARPNESS_GRID).astype(int)
+    xs = np.linspace(0, width - size, SHARPNESS_GRID).astype(int)
+    return np.stack([cv2.cvtColor(frame[y:y + size, x:x + size], cv2.COLOR_BGR2GRAY) for y in ys for x in xs])
+
+
+def laplacian_variance(patches):
+    """4 邻域拉普拉斯方差（同 cv2.Laplacian ksize=1，忽略 1 像素边框），(N, P, H, W) -> (N,)"""
+    signed = patches.astype(np.int16)
+    lap = (signed[..., :-2, 1:-1] + signed[..., 2:, 1:-1] + signed[..., 1:-1, :-2] + signed[..., 1:-1, 2:]
+           - 4 * signed[..., 1:-1, 1:-1])
+    return lap.reshape(len(patches), -1).astype(np.float32).var(axis=1)
+
+
+def score_frame_block(grays, prev_gray=None, prev_hist=None, patches=None):
+    """批量计算一组连续灰度帧的场景/运动/清晰度得分
+    
+    直方图、帧差和整帧清晰度逐帧计算，临时内存只与单帧大小有关（原始分辨率的 4K 块也不会成倍放大）。
+    
+    Args:
+        grays: (N, H, W) uint8 灰度帧
+        prev_gray: 上一块的最后一帧，None 表示视频开头
+        prev_hist: 上一块最后一帧的直方图
+        patches: (N, P, h, w) 原分辨率清晰度小块（见 sharpness_patches），None 时在 grays 上计算清晰度
+        
+    Returns:
+        (scene_scores, motion_scores, blur_scores, hists)，前三者形状为 (N,)
+    """
+    n = len(grays)
+    
+    # 每帧 256 级直方图
+    hists = np.stack([cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() for gray in grays]).astype(np.float64)
+    
+    # 场景变化：1 - 与前一帧直方图的相关系数（同 cv2.HISTCMP_CORREL）
+    first_hist = hists[0] if prev_hist is None else prev_hist
+    prev_hists = np.vstack([first_hist[None, :], hists[:-1]])
+    a = hists - hists.mean(axis=1, keepdims=True)
+    b = prev_hists - prev_hists.mean(axis=1, keepdims=True)
+    denom = np.sqrt((a * a).sum(axis=1) * (b * b).sum(axis=1))
+    corr = np.divide((a * b).sum(axis=1), denom, out=np.ones(n), where=denom > 0)
+    scene_scores = 1 - corr
+    if prev_hist is None:
+        scene_scores[0] = 0
+    
+    # 运动：与前一帧的平均绝对差
+    motion_scores = np.zeros(n)
+    previous = prev_gray
+    for i, gray in enumerate(grays):
+        if previous is not None:
+            motion_scores[i] = cv2.absdiff(gray, previous).mean()
+        previous = gray
+    
+    # 清晰度：4 邻域拉普拉斯方差
+    if patches is None:
+        blur_scores = np.array([
+            cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F, ksize=1)[1:-1, 1:-1])[1][0, 0] ** 2 for gray in grays
+        ])
+    else:
+        blur_scores = laplacian_variance(patches)
+    
+    return scene_scores, motion_scores, blur_scores, hists
+
+
+def _smart_candidates_opencv(
+    cap,
+    fps: float,
+    selector,
+    analysis_width: int,
+    block_size: int,
+    scene_threshold: float,
+    motion_threshold: float,
+    blur_threshold: float
+) -> int:
+    """OpenCV 引擎：逐块解码并批量评分，把候选帧交给 selector，返回候选数"""
+    candidate_count = 0
+    prev_gray = None
     prev_hist = None
     frame_count = 0
+    score_time = 0.0
     
     while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
+        block = []
+        patches = []
+        while len(block) < block_size:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            block.append(_analysis_proxy(frame, analysis_width))
+            patches.append(sharpness_patches(frame))
+            block_size = min(block_size, max(1, SMART_BLOCK_MAX_PIXELS // block[0].size))
+        if not block:
             break
         
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-        hist = cv2.normalize(hist, hist).flatten()
+        score_start = time.perf_counter()
+        grays = np.stack(block)
+        scene, motion, blur, hists = score_frame_block(grays, prev_gray, prev_hist, np.stack(patches))
+        total = scene * 0.4 + (motion / 100) * 0.4 + (blur / 1000) * 0.2
+        passed = (blur > blur_threshold) & ((scene > scene_threshold) | (motion > motion_threshold))
+        score_time += time.perf_counter() - score_start
         
-        scene_score = 0
-        if prev_hist is not None:
-            scene_score = 1 - cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
+        for j in np.flatnonzero(passed):
+            idx = frame_count + int(j)
+            candidate_count += 1
+            selector.offer(idx, float(total[j]), idx / fps)
         
-        motion_score = 0
-        if prev_frame is not None:
-            diff = cv2.absdiff(gray, prev_frame)
-            motion_score = np.mean(diff)
-        
-        blur_score = cv2.Laplacian(gray, cv2.CV_64F).var()
-        timestamp = frame_count / fps
-        
-        if blur_score > blur_threshold:
-            total_score = scene_score * 0.4 + (motion_score / 100) * 0.4 + (blur_score / 1000) * 0.2
-            
-            if scene_score > scene_threshold or motion_score > motion_threshold:
-                candidates.append((frame_count, total_score, frame.copy(), timestamp))
-        
-        prev_frame = gray.copy()
-        prev_hist = hist
-        frame_count += 1
+        prev_gray = grays[-1]
+        prev_hist = hists[-1]
+        frame_count += len(block)
+        if len(block) < block_size:
+            break
     
-    cap.release()
+    if score_time > 0:
+        print(f"  ⏱️ 评分吞吐: {frame_count / score_time:.0f} 帧/秒（分析宽度 {analysis_width or '原始'}）")
+    return candidate_count
+
+
+def detect_scene_changes_ffmpeg(video_path: str, threshold: float, analysis_width: int = None) -> list[tuple]:
+    """用 ffmpeg 的 select='gt(scene,T)' 在 C 层完成场景变化检测
     
-    print(f"  检测到 {len(candidates)} 个候选关键帧")
+    Returns:
+        [(timestamp, scene_score), ...]
+    """
+    filters = []
+    if analysis_width:
+        filters.append(f"scale='min({analysis_width},iw)':-2")
+    filters.append(f"select='gt(scene,{threshold})'")
+    filters.append("metadata=print:file=-")
+    
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', ','.join(filters),
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    
+    # 输出格式：
+    # frame:12   pts:12288   pts_time:0.4
+    # lavfi.scene_score=0.53
+    changes = []
+    timestamp = None
+    for line in result.stdout.splitlines():
+        match = _SHOWINFO_PTS.search(line)
+        if match:
+            timestamp = float(match.group(1))
+        elif line.startswith("lavfi.scene_score=") and timestamp is not None:
+            changes.append((timestamp, float(line.split("=", 1)[1])))
+            timestamp = None
+    return changes
+
+
+def _smart_candidates_ffmpeg(video_path: str, fps: float, selector, analysis_width: int, scene_threshold: float) -> int:
+    """ffmpeg 引擎：以 scene 得分作为候选帧得分交给 selector，返回候选数"""
+    changes = detect_scene_changes_ffmpeg(video_path, scene_threshold, analysis_width)
+    for timestamp, scene_score in changes:
+        selector.offer(int(round(timestamp * fps)), scene_score, timestamp)
+    return len(changes)
+
+
+def extract_keyframes_smart(
+    video_path: str,
+    output_dir: str,
+    max_frames: int = 20,
+    analysis_width: int = SMART_ANALYSIS_WIDTH,
+    block_size: int = 16,
+    engine: str = SMART_ENGINE
+) -> list[dict]:
+    """智能关键帧提取：场景变化+运动检测
+    
+    场景/运动得分在 analysis_width 宽的灰度代理图上按块批量计算，清晰度取原分辨率上的小块
+    （与模糊阈值的标定一致），不保留全分辨率画面；选出的帧最后再跳转回去解码保存。
+    analysis_width 为 0 时使用原始分辨率。
+    engine="ffmpeg" 时改由 ffmpeg scene 滤镜检测场景变化（只看场景得分，不做运动/模糊过滤）。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频: {video_path}")
+    
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = total_frames / fps if fps > 0 else 0
+    
+    print(f"  视频信息: {duration:.1f}秒, {fps:.1f}fps, {total_frames}帧")
+    
+    min_frame_gap = int(fps * 3)
+    scene_threshold = 0.15
+    motion_threshold = 5
+    blur_threshold = 50
+    
+    # 流式收集：只记录帧号、得分和时间戳，全分辨率画面最后再取
+    selector = DistributedFrameSelector(min_frame_gap, max_frames)
+    wall_start = time.perf_counter()
+    
+    if engine == "ffmpeg":
+        cap.release()
+        candidate_count = _smart_candidates_ffmpeg(video_path, fps, selector, analysis_width, scene_threshold)
+    else:
+        candidate_count = _smart_candidates_opencv(
+            cap, fps, selector, analysis_width, block_size,
+            scene_threshold, motion_threshold, blur_threshold
+        )
+        cap.release()
+    
+    print(f"  检测到 {candidate_count} 个候选关键帧（{engine} 引擎，耗时 {time.perf_counter() - wall_start:.1f}s）")
     
-    selected_frames = select_distributed_frames(candidates, total_frames, min_frame_gap, max_frames)
+    selected_frames = selector.result()
+    
+    # 只为最终入选的帧解码全分辨率画面
+    cap = cv2.VideoCapture(video_path)
+    decoded = dict(iter_sampled_frames(cap, [item[0] for item in selected_frames], "seek"))
+    cap.release()
     
     frame_infos = []
-    for i, (frame_idx, score, frame, timestamp) in enumerate(selected_frames):
+    for frame_idx, score, _, timestamp in selected_frames:
+        frame = decoded.get(frame_idx)
+        if frame is None:
+            continue
+        i = len(frame_infos)
         path = os.path.join(output_dir, f"frame_{i:04d}_t{int(timestamp)}.jpg")
         cv2.imwrite(path, frame)
         frame_infos.append({
@@ -266,6 +1092,17 @@ def extract_keyframes_smart(video_path: str, output_dir: str, max_frames: int =
     return frame_infos
 
 
+def _gap_conflicts(sorted_indices: list, frame_idx: int, min_gap: int) -> list:
+    """在有序帧号列表中查找与 frame_idx 间隔小于 min_gap 的帧号（最多左右各一个）"""
+    pos = bisect.bisect_left(sorted_indices, frame_idx)
+    conflicts = []
+    if pos > 0 and frame_idx - sorted_indices[pos - 1] < min_gap:
+        conflicts.append(sorted_indices[pos - 1])
+    if pos < len(sorted_indices) and sorted_indices[pos] - frame_idx < min_gap:
+        conflicts.append(sorted_indices[pos])
+    return conflicts
+
+
 def select_distributed_frames(candidates, total_frames, min_gap, max_count):
     """从候选帧中选择分布均匀的关键帧"""
     if not candidates:
@@ -274,26 +1111,63 @@ def select_distributed_frames(candidates, total_frames, min_gap, max_count):
     sorted_candidates = sorted(candidates, key=lambda x: x[1], reverse=True)
     
     selected = []
-    used_ranges = []
+    used_indices = []  # 有序帧号，用二分查找判断间隔
     
     for frame_idx, score, frame, timestamp in sorted_candidates:
         if len(selected) >= max_count:
             break
         
-        too_close = False
-        for used_idx in used_ranges:
-            if abs(frame_idx - used_idx) < min_gap:
-                too_close = True
-                break
-        
-        if not too_close:
+        if not _gap_conflicts(used_indices, frame_idx, min_gap):
             selected.append((frame_idx, score, frame, timestamp))
-            used_ranges.append(frame_idx)
+            bisect.insort(used_indices, frame_idx)
     
     selected.sort(key=lambda x: x[0])
     return selected
 
 
+class DistributedFrameSelector:
+    """流式版 select_distributed_frames：边解码边收集候选，结束时做完全相同的贪心选择
+    
+    候选可能在后面被更高分的帧挤掉、也可能因此重新入选，流式淘汰无法与离线结果一致，
+    所以只紧凑地记录每个候选的帧号、得分、时间戳（每个 24 字节，一小时 30fps 素材约 2.6 MB），
+    不保留画面；result() 时按得分降序（同分先出现的优先）依次选取与已选帧间隔不小于 min_gap 的帧。
+    """
+    
+    def __init__(self, min_gap: int, max_count: int):
+        self.min_gap = min_gap
+        self.max_count = max_count
+        self._indices = array("q")
+        self._scores = array("d")
+        self._timestamps = array("d")
+    
+    def offer(self, frame_idx: int, score: float, timestamp: float):
+        """提交一个候选帧"""
+        self._indices.append(frame_idx)
+        self._scores.append(score)
+        self._timestamps.append(timestamp)
+    
+    def __len__(self) -> int:
+        return len(self._indices)
+    
+    def result(self) -> list[tuple]:
+        """按帧号顺序返回选中的帧 [(frame_idx, score, None, timestamp), ...]，与 select_distributed_frames 一致"""
+        selected = []
+        used_indices = []  # 有序帧号，用二分查找判断间隔
+        if self.max_count <= 0 or not self._indices:
+            return selected
+        
+        for i in np.argsort(-np.frombuffer(self._scores, dtype=np.float64), kind="stable"):
+            if len(selected) >= self.max_count:
+                break
+            frame_idx = self._indices[i]
+            if not _gap_conflicts(used_indices, frame_idx, self.min_gap):
+                selected.append((frame_idx, self._scores[i], None, self._timestamps[i]))
+                bisect.insort(used_indices, frame_idx)
+        
+        selected.sort(key=lambda x: x[0])
+        return selected
+
+
 def get_video_duration(video_path: str) -> float:
     """获取视频时长（秒）"""
     cap = cv2.VideoCapture(video_path)
@@ -320,3 +1194,100 @@ def extract_clip(video_path: str, start_sec: float, end_sec: float, output_path:
     subprocess.run(cmd, capture_output=True, check=True)
     
     return output_path
+
+
+def sampling_benchmark(video_paths: list[str], interval: float = FRAME_SAMPLE_INTERVAL,
+                       modes: tuple = ("seek", "grab", "linear")):
+    """每个视频按 interval 秒等间隔采样，对比各解码方式的耗时
+    
+    每帧记录一个降采样校验值，与 linear（逐帧解码）的结果比较，确认跳转解出的是同一帧。
+    """
+    for video_path in video_paths:
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        duration = total_frames / fps if fps > 0 else 0
+        frame_interval = max(1, int(fps * interval))
+        print(f"{video_path}: {duration:.1f}秒, {fps:.1f}fps, {total_frames}帧，每 {interval:g} 秒采样")
+        
+        timings = {}
+        checksums = {}
+        for mode in modes:
+            cap = cv2.VideoCapture(video_path)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            checksums[mode] = {
+                frame_idx: zlib.crc32(np.ascontiguousarray(frame[::8, ::8]).tobytes())
+                for frame_idx, frame in iter_sampled_frames(cap, _sample_indices(total_frames, frame_interval), mode)
+            }
+            timings[mode] = (time.perf_counter() - wall_start, time.process_time() - cpu_start)
+            cap.release()
+        
+        base_mode = "linear" if "linear" in timings else modes[0]
+        reference = checksums.get("linear")
+        for mode in modes:
+            wall, cpu = timings[mode]
+            line = (f"  {mode:<6} {len(checksums[mode])} 帧  {wall:.2f}s 墙钟 / {cpu:.2f}s CPU"
+                    f"  相对 {base_mode} {timings[base_mode][0] / max(wall, 1e-9):.1f}x")
+            if reference is not None and mode != "linear":
+                same = sum(reference.get(idx) == crc for idx, crc in checksums[mode].items())
+                line += f"  与 linear 一致 {same}/{len(reference)}"
+            print(line)
+
+
+def batch_benchmark(video_paths: list[str], sizes: tuple = (1, 4, 8, 16), sample_interval: float = 5.0):
+    """依次用不同的 YOLO 批大小检测采样帧，打印 CPU 吞吐（检查帧数 / 本进程 CPU 时间）
+    
+    解码不放到后台线程（pipelined=False），不与检测重叠，差异只来自批处理本身。
+    """
+    from modules.bird_detector import warm_up
+    
+    def scan(size: int) -> int:
+        checked = 0
+        for path in video_paths:
+            cap = cv2.VideoCapture(path)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            frame_interval = max(1, int(cap.get(cv2.CAP_PROP_FPS) * sample_interval))
+            indices = _sample_indices(total_frames, frame_interval)
+            for _ in _detect_sampled_frames(cap, indices, 0.25, FRAME_SEEK_MODE, size, pipelined=False):
+                checked += 1
+            cap.release()
+        return checked
+    
+    warm_up()  # 模型加载不计入耗时
+    baseline = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        scan(sizes[0])  # 预热解码器
+    
+    for size in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cpu_start = time.process_time()
+            checked = scan(size)
+            cpu = time.process_time() - cpu_start
+        rate = checked / cpu if cpu > 0 else 0.0
+        baseline = baseline or rate
+        print(f"  批大小 {size:>3}: {checked} 帧，CPU {cpu:.2f}s，{rate:.1f} 帧/CPU秒"
+              f"（{rate / baseline if baseline else 0:.2f}x）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键帧采样工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sampling = sub.add_parser("bench-sampling", help="对比 seek/grab/linear 采样解码")
+    sampling.add_argument("videos", nargs="+", help="测试视频")
+    sampling.add_argument("--interval", type=float, default=FRAME_SAMPLE_INTERVAL, help="采样间隔（秒）")
+    sampling.add_argument("--modes", nargs="+", default=["seek", "grab", "linear"], help="要对比的解码方式")
+    batch = sub.add_parser("bench-batch", help="对比鸟类抽帧的 YOLO 批大小")
+    batch.add_argument("videos", nargs="+", help="测试视频")
+    batch.add_argument("--sizes", nargs="+", type=int, default=[1, 4, 8, 16], help="要对比的批大小")
+    batch.add_argument("--interval", type=float, default=5.0, help="采样间隔（秒）")
+    args = parser.parse_args()
+    
+    if args.command == "bench-sampling":
+        sampling_benchmark(args.videos, args.interval, tuple(args.modes))
+    else:
+        batch_benchmark(args.videos, tuple(args.sizes), args.interval)
+
+
+if __name__ == "__main__":
+    main()
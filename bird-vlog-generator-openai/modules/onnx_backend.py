@@ -0,0 +1,258 @@
+"""ONNX Runtime 检测后端 - CPU 推理（可选 INT8 量化），结果格式与 bird_detector 一致
+
+需要额外安装: pip install onnxruntime
+
+导出模型（需要 ultralytics，只需执行一次）；INT8 为静态量化（QDQ），需要一组样本帧做校准：
+    python -m modules.onnx_backend export [--int8 --calib 样本1.jpg 样本2.jpg ...]
+
+在固定样本集上对比 ultralytics 与 ONNX（FP32 / INT8）后端的一致性与吞吐：
+    python -m modules.onnx_backend compare 图片1.jpg 图片2.jpg ...
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import ONNX_MODEL_PATH, ONNX_INT8
+
+from modules.bird_detector import BIRD_CLASS_ID, BASE_CONFIDENCE, BirdDetections, torch_threads
+
+INPUT_SIZE = 640
+# 与 ultralytics 预测的默认值保持一致
+NMS_IOU = 0.7
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def onnx_model_path(int8: bool = ONNX_INT8) -> str:
+    """当前使用的 ONNX 模型路径（INT8 时为 xxx.int8.onnx）"""
+    if int8:
+        stem, ext = os.path.splitext(ONNX_MODEL_PATH)
+        return f"{stem}.int8{ext}"
+    return ONNX_MODEL_PATH
+
+
+def load_session(path: str):
+    """创建 onnxruntime 推理会话
+    
+    检测池的各线程共用一个会话并发 run，每次 run 的 intra-op 线程数与 torch 后端
+    一样取 torch_threads()，总数不超过 CPU 核数。
+    """
+    import onnxruntime as ort
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX 模型不存在: {path}，请先运行 python -m modules.onnx_backend export")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = torch_threads()
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def get_session():
+    """获取或初始化当前配置（ONNX_INT8）的推理会话（会话本身支持多线程并发 run）"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = load_session(onnx_model_path())
+    return _session
+
+
+def _head_nodes(model) -> list[str]:
+    """检测头（编号最大的 /model.N/ 模块，即 Detect）的节点名：框回归和类别分数对量化误差敏感，保持 FP32"""
+    pattern = re.compile(r"^/model\.(\d+)/")
+    numbered = [(int(m.group(1)), node.name) for node in model.graph.node if (m := pattern.match(node.name))]
+    if not numbered:
+        return []
+    head = max(index for index, _ in numbered)
+    return [name for index, name in numbered if index == head]
+
+
+def _calibration_reader(model_path: str, image_paths: list[str]):
+    """静态量化的校准数据：样本帧按推理时同样的 letterbox 预处理后逐张提供"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader
+    
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(image_paths)
+        
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: _prepare(image)[0][None]}
+            return None
+    
+    return Reader()
+
+
+def export_model(int8: bool = False, calibration_images: list[str] = None) -> str:
+    """用 ultralytics 导出 ONNX 模型，int8 时再用 calibration_images 做静态 INT8 量化
+    
+    动态量化会把卷积换成 ConvInteger，onnxruntime 的 CPU 上没有快速实现（通常比 FP32 还慢），
+    所以用 QDQ 格式的静态量化（卷积融合为 QLinearConv），检测头保持 FP32。
+    """
+    from modules.bird_detector import get_model
+    
+    if int8 and not calibration_images:
+        raise ValueError("INT8 量化需要校准样本帧（--calib）")
+    
+    exported = get_model().export(format="onnx", imgsz=INPUT_SIZE, dynamic=True, simplify=True)
+    os.makedirs(os.path.dirname(ONNX_MODEL_PATH) or ".", exist_ok=True)
+    if os.path.abspath(exported) != os.path.abspath(ONNX_MODEL_PATH):
+        os.replace(exported, ONNX_MODEL_PATH)
+    
+    if not int8:
+        return ONNX_MODEL_PATH
+    
+    import onnx
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    
+    quantized = onnx_model_path(int8=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(ONNX_MODEL_PATH, prepared)
+        quantize_static(
+            prepared, quantized, _calibration_reader(prepared, calibration_images),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            nodes_to_exclude=_head_nodes(onnx.load(prepared))
+        )
+    return quantized
+
+
+def _letterbox(image):
+    """等比缩放到 INPUT_SIZE 并用灰边补齐（同 ultralytics LetterBox），返回 (图像, 缩放比, 左/上偏移)"""
+    height, width = image.shape[:2]
+    ratio = min(INPUT_SIZE / height, INPUT_SIZE / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_w, pad_h = (INPUT_SIZE - new_w) / 2, (INPUT_SIZE - new_h) / 2
+    
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return image, ratio, (left, top)
+
+
+def _postprocess(output, ratio: float, offset: tuple, shape: tuple, confidence: float) -> BirdDetections:
+    """解析单张图的输出 (84, N)：只保留最高分类别为鸟的框，NMS 后映射回原图坐标"""
+    scores = output[4:]
+    classes = scores.argmax(axis=0)
+    confs = scores.max(axis=0)
+    keep = (classes == BIRD_CLASS_ID) & (confs >= max(BASE_CONFIDENCE, confidence))
+    
+    boxes = output[:4, keep].T  # cx, cy, w, h
+    confs = confs[keep]
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+    xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+    xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+    xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+    
+    if len(confs):
+        xywh = np.column_stack([xyxy[:, :2], boxes[:, 2:]])
+        order = cv2.dnn.NMSBoxes(xywh.tolist(), confs.tolist(), 0.0, NMS_IOU)
+        order = np.array(order, dtype=int).reshape(-1)
+        xyxy, confs = xyxy[order], confs[order]
+    
+    height, width = shape[:2]
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - offset[0]) / ratio).clip(0, width)
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - offset[1]) / ratio).clip(0, height)
+    
+    return BirdDetections(confs.astype(np.float32), xyxy.astype(np.float32))
+
+
+def _prepare(image):
+    """letterbox 后转成模型输入 (3, H, W) float32，返回 (输入, 缩放比, 偏移)"""
+    boxed, ratio, offset = _letterbox(image)
+    blob = cv2.cvtColor(boxed, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+    return blob, ratio, offset
+
+
+def detect_onnx(sources: list, confidence: float = 0.3, session=None) -> list[BirdDetections]:
+    """批量检测（图像帧或图片路径），返回格式同 bird_detector.detect_local；session 默认为 get_session()"""
+    session = session or get_session()
+    input_meta = session.get_inputs()[0]
+    
+    images = [cv2.imread(src) if isinstance(src, str) else src for src in sources]
+    prepared = [_prepare(image) for image in images]
+    
+    # 动态 batch 的模型一次推理整批，否则逐张推理
+    if isinstance(input_meta.shape[0], int):
+        outputs = [session.run(None, {input_meta.name: blob[None]})[0][0] for blob, _, _ in prepared]
+    else:
+        outputs = session.run(None, {input_meta.name: np.stack([p[0] for p in prepared])})[0]
+    
+    return [
+        _postprocess(output, ratio, offset, image.shape, confidence)
+        for output, (_, ratio, offset), image in zip(outputs, prepared, images)
+    ]
+
+
+def compare_backends(image_paths: list[str], confidence: float = 0.3):
+    """在同一组图片上对比 ultralytics 与 ONNX 后端（FP32，以及已导出的 INT8）：有无鸟一致率、置信度误差、吞吐"""
+    from modules.bird_detector import get_model, detect_local
+    import modules.bird_detector as bird_detector
+    
+    frames = [cv2.imread(path) for path in image_paths]
+    
+    backend = bird_detector.DETECT_BACKEND
+    try:
+        bird_detector.DETECT_BACKEND = "ultralytics"
+        get_model()
+        start = time.perf_counter()
+        reference = detect_local(frames, confidence)
+        ref_fps = len(frames) / (time.perf_counter() - start)
+    finally:
+        bird_detector.DETECT_BACKEND = backend
+    
+    print(f"样本数: {len(frames)}")
+    print(f"  ultralytics: {ref_fps:.1f} 帧/秒")
+    
+    for label, path in (("FP32", onnx_model_path(int8=False)), ("INT8", onnx_model_path(int8=True))):
+        if not os.path.exists(path):
+            print(f"  onnxruntime {label}: 未导出（{path}）")
+            continue
+        session = load_session(path)
+        detect_onnx(frames[:1], confidence, session)  # 预热
+        start = time.perf_counter()
+        candidate = detect_onnx(frames, confidence, session)
+        fps = len(frames) / (time.perf_counter() - start)
+        
+        agree = sum(r.has_bird == c.has_bird for r, c in zip(reference, candidate))
+        conf_err = [abs(r.confidence - c.confidence) for r, c in zip(reference, candidate)]
+        print(f"  onnxruntime {label}: {fps:.1f} 帧/秒（{fps / ref_fps:.2f}x），"
+              f"有无鸟一致率 {agree / len(frames):.1%}，置信度平均绝对误差 {np.mean(conf_err):.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX 检测后端工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="导出 ONNX 模型")
+    export.add_argument("--int8", action="store_true", help="额外生成 INT8 静态量化模型")
+    export.add_argument("--calib", nargs="+", metavar="IMAGE", help="INT8 校准用的样本帧（建议几十到上百张实际画面）")
+    compare = sub.add_parser("compare", help="对比 ultralytics 与 ONNX 后端")
+    compare.add_argument("images", nargs="+", help="样本图片")
+    args = parser.parse_args()
+    
+    if args.command == "export":
+        print(f"✓ 已导出: {export_model(int8=args.int8, calibration_images=args.calib)}")
+    else:
+        compare_backends(args.images)
+
+
+if __name__ == "__main__":
+    main()
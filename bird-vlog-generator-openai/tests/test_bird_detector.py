@@ -0,0 +1,45 @@
+"""bird_detector 中不需要 YOLO 模型的部分：切片窗口"""
+
+import numpy as np
+
+from modules.bird_detector import motion_regions, tile_windows
+
+
+def _covered(windows, x, y):
+    return any(tx <= x < tx + tw and ty <= y < ty + th for tx, ty, tw, th in windows)
+
+
+def test_full_tiles_cover_the_frame():
+    windows = tile_windows((2160, 3840, 3), 640)
+    assert all(tw == th == 640 for _, _, tw, th in windows)
+    assert all(_covered(windows, x, y) for x in (0, 1919, 3839) for y in (0, 1079, 2159))
+
+
+def test_small_frame_is_a_single_tile():
+    assert tile_windows((360, 640, 3), 1280) == [(0, 0, 640, 360)]
+
+
+def test_motion_tiles_never_exceed_full_tiling():
+    """风吹树叶等零散的小运动：切片数不能超过整帧切片"""
+    rng = np.random.default_rng(0)
+    previous = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    frame = previous.copy()
+    spots = [(int(x), int(y)) for x, y in zip(rng.integers(0, 3800, 60), rng.integers(0, 2120, 60))]
+    for x, y in spots:
+        frame[y:y + 40, x:x + 40] = 255
+    
+    full = tile_windows(frame.shape, 640)
+    motion = tile_windows(frame.shape, 640, motion_regions(frame, previous))
+    
+    assert len(motion) <= len(full)
+    assert set(motion) <= set(full)
+    assert all(_covered(motion, x + 20, y + 20) for x, y in spots)
+
+
+def test_motion_tiles_only_near_the_motion():
+    previous = np.zeros((2160, 3840, 3), dtype=np.uint8)
+    frame = previous.copy()
+    frame[100:140, 100:140] = 255
+    
+    motion = tile_windows(frame.shape, 640, motion_regions(frame, previous))
+    assert motion == [(0, 0, 640, 640)]
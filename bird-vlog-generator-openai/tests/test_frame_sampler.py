@@ -0,0 +1,326 @@
+"""frame_sampler 的纯函数与内存上限测试（用合成数据，不需要 YOLO 模型）"""
+
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+from modules import bird_detector, frame_sampler
+from modules.bird_detector import BirdDetections
+from modules.frame_sampler import (
+    DistributedFrameSelector, laplacian_variance, push_top_k, score_frame_block, select_distributed_frames,
+    sharpness_patches, stratified_order
+)
+
+
+def test_push_top_k_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 10, 200).tolist()  # 大量同分
+    heap = []
+    for seq, score in enumerate(scores):
+        push_top_k(heap, 7, score, seq, lambda seq=seq: seq)
+    
+    expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:7]
+    assert sorted(item for _, item in heap) == sorted(expected)
+
+
+def test_push_top_k_only_builds_selected_items():
+    built = []
+    heap = []
+    for seq, score in enumerate([5, 1, 7, 2, 9]):
+        push_top_k(heap, 2, score, seq, lambda seq=seq: built.append(seq) or seq)
+    assert built == [0, 1, 2, 4]
+    assert not push_top_k(heap, 0, 100, 99, lambda: pytest.fail("k=0 时不应入选"))
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 7, 8, 9, 100])
+def test_stratified_order_is_a_permutation(n):
+    assert sorted(stratified_order(n)) == list(range(n))
+
+
+def test_stratified_order_prefixes_are_spread_out():
+    order = list(stratified_order(64))
+    assert order[:4] == [0, 32, 16, 48]
+    # 任意 2^k 长度的前缀在时间上等间隔
+    assert sorted(order[:8]) == list(range(0, 64, 8))
+
+
+def test_score_frame_block_matches_opencv():
+    rng = np.random.default_rng(1)
+    grays = rng.integers(0, 256, (5, 24, 32), dtype=np.uint8)
+    prev = rng.integers(0, 256, (24, 32), dtype=np.uint8)
+    prev_hist = cv2.calcHist([prev], [0], None, [256], [0, 256]).ravel().astype(np.float64)
+    
+    scene, motion, blur, hists = score_frame_block(grays, prev, prev_hist)
+    
+    previous = prev
+    for i, gray in enumerate(grays):
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        prev_hist_cv = cv2.calcHist([previous], [0], None, [256], [0, 256])
+        assert scene[i] == pytest.approx(1 - cv2.compareHist(hist, prev_hist_cv, cv2.HISTCMP_CORREL), abs=1e-6)
+        assert motion[i] == pytest.approx(cv2.absdiff(gray, previous).mean())
+        lap = cv2.Laplacian(gray, cv2.CV_64F, ksize=1)[1:-1, 1:-1]
+        assert blur[i] == pytest.approx(lap.var(), rel=1e-4)
+        assert np.array_equal(hists[i], hist.ravel())
+        previous = gray
+
+
+def test_score_frame_block_video_start():
+    grays = np.full((3, 8, 8), 100, dtype=np.uint8)
+    scene, motion, blur, _ = score_frame_block(grays)
+    assert scene.tolist() == [0, 0, 0]
+    assert motion.tolist() == [0, 0, 0]
+    assert blur.tolist() == [0, 0, 0]
+
+
+def test_score_frame_block_memory_is_per_frame():
+    """原始分辨率（SMART_ANALYSIS_WIDTH=0）的一块帧：临时内存不随块大小成倍放大"""
+    grays = np.random.default_rng(3).integers(0, 256, (6, 1080, 1920), dtype=np.uint8)
+    frame_bytes = grays[0].nbytes
+    
+    tracemalloc.start()
+    try:
+        score_frame_block(grays, grays[0])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert peak < 8 * frame_bytes
+
+
+def _natural_image(height, width, seed=0):
+    """1/f 频谱的合成"自然"图像（BGR）"""
+    rng = np.random.default_rng(seed)
+    fy = np.fft.fftfreq(height)[:, None]
+    fx = np.fft.fftfreq(width)[None, :]
+    f = np.sqrt(fx ** 2 + fy ** 2)
+    f[0, 0] = 1
+    image = np.real(np.fft.ifft2((rng.normal(size=f.shape) + 1j * rng.normal(size=f.shape)) / f ** 1.1))
+    gray = np.clip((image - image.mean()) / image.std() * 40 + 128, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def test_sharpness_patches_estimate_full_resolution_blur():
+    """清晰度按原分辨率估计：与整幅拉普拉斯方差接近，几个像素的模糊能被 blur_threshold=50 挡住"""
+    sharp = _natural_image(720, 1280)
+    for frame in (sharp, cv2.GaussianBlur(sharp, (0, 0), 2.5)):
+        full = cv2.Laplacian(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+        estimate = laplacian_variance(sharpness_patches(frame)[None])[0]
+        assert estimate == pytest.approx(full, rel=0.15)
+    
+    blurred = cv2.GaussianBlur(sharp, (0, 0), 2.5)
+    assert laplacian_variance(sharpness_patches(sharp)[None])[0] > 50
+    assert laplacian_variance(sharpness_patches(blurred)[None])[0] < 50
+
+
+def test_sharpness_patches_small_frame_uses_whole_image():
+    frame = _natural_image(120, 160)
+    assert sharpness_patches(frame).shape == (1, 120, 160)
+
+
+@pytest.fixture
+def synthetic_video(tmp_path):
+    """150 帧 640x360 的合成视频"""
+    path = str(tmp_path / "birds.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (640, 360))
+    if not writer.isOpened():
+        pytest.skip("当前 OpenCV 不能写入视频")
+    rng = np.random.default_rng(2)
+    for i in range(150):
+        frame = rng.integers(0, 256, (360, 640, 3), dtype=np.uint8)
+        cv2.putText(frame, str(i), (20, 200), cv2.FONT_HERSHEY_SIMPLEX, 4, (255, 255, 255), 8)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_bird_detection_keeps_only_top_frames_in_memory(synthetic_video, tmp_path, monkeypatch):
+    """每帧都有鸟时，内存中也只保留 max_frames 幅全分辨率画面（外加一个批次）"""
+    def fake_detect(frames, confidence=0.3):
+        rng = np.random.default_rng(len(frames))
+        return [BirdDetections(np.array([rng.random()], dtype=np.float32), np.array([[1, 2, 3, 4]], dtype=np.float32))
+                for _ in frames]
+    monkeypatch.setattr(bird_detector, "detect_bird_records", fake_detect)
+    
+    frame_bytes = 640 * 360 * 3
+    tracemalloc.start()
+    try:
+        frame_infos = frame_sampler.extract_keyframes_with_bird_detection(
+            synthetic_video, str(tmp_path / "out"), max_frames=3, sample_interval=1 / 30,
+            sampling="linear", batch_size=4, pipelined=False, use_index=False, motion_gate="off", tile_mode="off"
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    
+    assert len(frame_infos) == 3
+    # 150 帧全部保留需要约 100 MB；上限：3 个候选 + 正在检测与正在攒的两个批次 + 少量余量
+    assert peak < (3 + 2 * 4 + 4) * frame_bytes
+
+
+def test_smart_block_size_is_capped_by_pixels(synthetic_video, monkeypatch):
+    blocks = []
+    original = frame_sampler.score_frame_block
+    
+    def spy(grays, *args):
+        blocks.append(len(grays))
+        return original(grays, *args)
+    
+    monkeypatch.setattr(frame_sampler, "score_frame_block", spy)
+    monkeypatch.setattr(frame_sampler, "SMART_BLOCK_MAX_PIXELS", 3 * 640 * 360)
+    
+    cap = cv2.VideoCapture(synthetic_video)
+    try:
+        frame_sampler._smart_candidates_opencv(cap, 30, DistributedFrameSelector(90, 5), 0, 16, 0.15, 5, 50)
+    finally:
+        cap.release()
+    assert max(blocks) == 3 and sum(blocks) == 150
+
+
+def _run_selector(candidates, min_gap, max_count):
+    selector = DistributedFrameSelector(min_gap, max_count)
+    for frame_idx, score, _, timestamp in candidates:
+        selector.offer(frame_idx, score, timestamp)
+    return selector.result()
+
+
+def test_distributed_selector_small_case():
+    candidates = [(0, 5.0, None, 0.0), (2, 6.0, None, 2.0), (4, 7.0, None, 4.0)]
+    assert [c[0] for c in _run_selector(candidates, 3, 5)] == [0, 4]
+
+
+@pytest.mark.parametrize("seed", range(30))
+@pytest.mark.parametrize("dense, min_gap, max_count", [(True, 90, 20), (True, 90, 3), (False, 3, 5)])
+def test_distributed_selector_matches_offline(seed, dense, min_gap, max_count):
+    rng = np.random.default_rng(seed)
+    if dense:
+        indices = np.arange(3000)  # 每帧都是候选（如有风的画面）
+        scores = rng.random(len(indices))
+    else:
+        indices = np.sort(rng.choice(200, 60, replace=False))
+        scores = rng.integers(0, 5, len(indices)).astype(float)  # 大量同分
+    candidates = [(int(i), float(s), None, i / 30) for i, s in zip(indices, scores)]
+    
+    assert _run_selector(candidates, min_gap, max_count) == select_distributed_frames(
+        candidates, None, min_gap, max_count
+    )
+
+
+def test_seek_skips_targets_past_the_real_end(synthetic_video):
+    """CAP_PROP_FRAME_COUNT 只是估计值：超出结尾的目标不应结束整个（按位反转顺序的）扫描"""
+    cap = cv2.VideoCapture(synthetic_video)
+    try:
+        frames = list(frame_sampler.iter_sampled_frames(cap, [10, 5000, 20, 149, 150, 30], "seek"))
+    finally:
+        cap.release()
+    assert [idx for idx, _ in frames] == [10, 20, 149, 30]
+
+
+class _UnseekableCapture:
+    """POS_FRAMES 不可信的视频：跳转总是落回开头，统计实际解码的帧数"""
+    
+    def __init__(self, path, total_frames=3000, fps=30):
+        self.total_frames = total_frames
+        self.fps = fps
+        self.pos = 0
+        self.decoded = 0
+    
+    def isOpened(self):
+        return True
+    
+    def get(self, prop):
+        return {cv2.CAP_PROP_FPS: self.fps, cv2.CAP_PROP_FRAME_COUNT: self.total_frames,
+                cv2.CAP_PROP_POS_FRAMES: self.pos}.get(prop, 0)
+    
+    def set(self, prop, value):
+        self.pos = 0
+        return True
+    
+    def grab(self):
+        if self.pos >= self.total_frames:
+            return False
+        self.pos += 1
+        self.decoded += 1
+        return True
+    
+    def read(self):
+        frame_idx = self.pos
+        if not self.grab():
+            return False, None
+        return True, np.full((36, 64, 3), frame_idx, dtype=np.int32)
+    
+    def release(self):
+        pass
+
+
+def test_budgeted_scan_on_unseekable_video_decodes_once(tmp_path, monkeypatch):
+    """不可跳转时预算扫描不能按位反转顺序反复从头解码：改为一次顺序扫描，推理次数不超过预算"""
+    captures = []
+    
+    def fake_capture(path):
+        captures.append(_UnseekableCapture(path))
+        return captures[-1]
+    
+    checked = []
+    
+    def fake_detect(frames, confidence=0.3):
+        checked.extend(int(frame[0, 0, 0]) for frame in frames)
+        return [BirdDetections(np.array([0.9], dtype=np.float32), np.array([[1, 2, 3, 4]], dtype=np.float32))
+                for _ in frames]
+    
+    monkeypatch.setattr(frame_sampler.cv2, "VideoCapture", fake_capture)
+    monkeypatch.setattr(bird_detector, "detect_bird_records", fake_detect)
+    
+    frame_sampler.extract_keyframes_with_bird_detection(
+        "unseekable.mp4", str(tmp_path / "out"), max_frames=3, sample_interval=1.0, sampling="seek",
+        batch_size=4, pipelined=False, use_index=False, refine=False, budget=25, target_confidence=0.5,
+        motion_gate="off", tile_mode="off"
+    )
+    
+    # 100 个采样点、预算 25：每 4 个采样点取一个，按时间递增
+    assert checked == list(range(0, 3000, 120))
+    assert captures[0].decoded <= captures[0].total_frames
+
+
+def test_motion_gated_detection_buffers_at_most_one_batch(monkeypatch):
+    """跳过的帧也计入批次：门控几乎一直跳过时，内存中也最多攒 batch_size 幅画面"""
+    consumed = []
+    
+    def fake_sampled(cap, indices, mode):
+        for idx in indices:
+            consumed.append(idx)
+            yield idx, np.zeros((4, 4, 3), dtype=np.uint8)
+    
+    class SkipMostGate:
+        def should_detect(self, frame):
+            return len(consumed) % 50 == 1
+    
+    monkeypatch.setattr(frame_sampler, "iter_sampled_frames", fake_sampled)
+    monkeypatch.setattr(bird_detector, "detect_bird_records", lambda frames, confidence=0.3: [BirdDetections() for _ in frames])
+    
+    scan = frame_sampler._detect_sampled_frames(None, range(200), 0.25, "seek", 4, False, SkipMostGate())
+    results = []
+    for item in scan:
+        assert len(consumed) - len(results) <= 4
+        results.append(item)
+    assert [idx for idx, _, _ in results] == list(range(200))
+
+
+@pytest.mark.parametrize("method", ["diff", "mog2"])
+def test_motion_gate_reinspects_when_bird_leaves(method):
+    """鸟离开后画面回到背景：必须重新推理，不能沿用"有鸟"的旧结果"""
+    rng = np.random.default_rng(4)
+    background = cv2.GaussianBlur(rng.integers(0, 256, (180, 320, 3), dtype=np.uint8), (9, 9), 0)
+    gate = frame_sampler.MotionGate(method, threshold=0.005, max_skip=100)
+    
+    decisions = []
+    for i in range(40):
+        frame = background.copy()
+        if 20 <= i < 28:
+            cv2.rectangle(frame, (140, 70), (180, 110), (0, 0, 255), -1)
+        decisions.append(gate.should_detect(frame))
+    
+    assert decisions[20], "鸟出现时应推理"
+    assert decisions[28], "鸟离开时应推理"
+    assert not any(decisions[29:]), "静止背景应跳过"
@@ -6,11 +6,13 @@ import sys
 import json
 import argparse
 import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from config import OUTPUT_DIR, BGM_DIR
 from modules.frame_sampler import extract_keyframes, get_video_duration
-from modules.bedrock_analyzer import batch_analyze, filter_highlights
+from modules.bedrock_analyzer import batch_analyze, filter_highlights, triage_stats, upload_stats
+from modules import analysis_cache, frame_dedupe
 from modules.script_generator import generate_script, generate_script_with_segments, generate_subtitles, generate_subtitles_for_segments, save_srt
 from modules.polly_tts import text_to_speech
 from modules.video_composer import compose_video, create_slideshow, compose_from_highlights
@@ -51,7 +53,8 @@ def generate_vlog(
     merge: bool = False,
     birds: str = None,
     duration: float = None,
-    workers: int = 5
+    workers: int = 5,
+    video_jobs: int = 1
 ) -> str:
     """一键生成观鸟 Vlog"""
     if output_dir is None:
@@ -73,7 +76,7 @@ def generate_vlog(
     print()
     
     if merge and len(video_files) > 1:
-        return generate_merged_vlog(video_files, output_dir, style, mode, birds, duration, workers)
+        return generate_merged_vlog(video_files, output_dir, style, mode, birds, duration, workers, video_jobs)
     else:
         results = []
         for i, video in enumerate(video_files):
@@ -90,6 +93,23 @@ def generate_vlog(
             return output_dir
 
 
+def _print_analysis_stats():
+    """打印 AI 分析的累计统计：缓存命中、相似帧去重、联系表粗筛、上传体积"""
+    print(f"  分析缓存: 累计命中 {analysis_cache.stats['hits']} / 未命中 {analysis_cache.stats['misses']}")
+    if frame_dedupe.stats["frames"]:
+        saved = frame_dedupe.stats["frames"] - frame_dedupe.stats["clusters"]
+        print(f"  相似帧去重: 累计 {frame_dedupe.stats['frames']} 帧分为 {frame_dedupe.stats['clusters']} 组，省去 {saved} 次分析")
+    if triage_stats["frames"]:
+        print(f"  联系表粗筛: 累计 {triage_stats['frames']} 帧拼成 {triage_stats['sheets']} 张"
+              f"（{triage_stats['hits']} 帧沿用缓存的粗筛结果），{triage_stats['promoted']} 帧进入逐帧分析")
+    if upload_stats["images"]:
+        original_mb = upload_stats["original_bytes"] / 1e6
+        sent_mb = upload_stats["sent_bytes"] / 1e6
+        saving = 100 * (1 - upload_stats["sent_bytes"] / max(upload_stats["original_bytes"], 1))
+        print(f"  上传: 累计 {upload_stats['images']} 张图 {original_mb:.1f} MB → {sent_mb:.1f} MB（节省 {saving:.0f}%），"
+              f"平均请求耗时 {upload_stats['request_seconds'] / max(upload_stats['requests'], 1):.2f}s")
+
+
 def process_single_video(
     input_video: str,
     output_dir: str,
@@ -122,6 +142,7 @@ def process_single_video(
     
     analysis_results = batch_analyze(frame_infos, max_workers=workers, progress_callback=progress)
     print()
+    _print_analysis_stats()
     
     # 保存分析结果
     analysis_file = os.path.join(work_dir, "analysis.json")
@@ -200,7 +221,8 @@ def generate_merged_vlog(
     mode: str,
     birds: str = None,
     duration: float = None,
-    workers: int = 5
+    workers: int = 5,
+    video_jobs: int = 1
 ) -> str:
     """将多个视频合并为一个精彩 Vlog"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -217,11 +239,21 @@ def generate_merged_vlog(
     frames_dir = os.path.join(work_dir, "frames")
     os.makedirs(frames_dir, exist_ok=True)
     
-    for i, video in enumerate(video_files):
+    def extract(i, video):
         print(f"  处理 [{i+1}/{len(video_files)}]: {os.path.basename(video)}")
         video_frames_dir = os.path.join(frames_dir, f"video_{i:03d}")
-        frame_infos = extract_keyframes(video, video_frames_dir)
-        all_frame_infos.extend(frame_infos)
+        return extract_keyframes(video, video_frames_dir)
+    
+    if video_jobs > 1:
+        # 多个视频并行抽帧，检测模型池同步扩容，torch 线程按实例数平分 CPU
+        from modules.bird_detector import set_pool_size
+        set_pool_size(video_jobs)
+        with ThreadPoolExecutor(max_workers=video_jobs) as pool:
+            for frame_infos in pool.map(extract, range(len(video_files)), video_files):
+                all_frame_infos.extend(frame_infos)
+    else:
+        for i, video in enumerate(video_files):
+            all_frame_infos.extend(extract(i, video))
     
     print(f"  ✓ 共提取 {len(all_frame_infos)} 帧")
     print()
@@ -233,6 +265,7 @@ def generate_merged_vlog(
     
     all_analysis = batch_analyze(all_frame_infos, max_workers=workers, progress_callback=progress)
     print()
+    _print_analysis_stats()
     
     # 保存分析结果
     analysis_file = os.path.join(work_dir, "analysis.json")
@@ -362,6 +395,7 @@ def main():
     parser.add_argument("--birds", "--bird", help="指定预期观察到的鸟类名称")
     parser.add_argument("--duration", type=float, help="设置目标 Vlog 理想时长（秒）")
     parser.add_argument("--workers", type=int, default=5, help="AI 分析并行线程数 (默认: 5)")
+    parser.add_argument("--video-jobs", type=int, default=1, help="合并模式下并行抽帧的视频数 (默认: 1)")
     
     args = parser.parse_args()
     
@@ -378,7 +412,8 @@ def main():
             merge=args.merge,
             birds=args.birds,
             duration=args.duration,
-            workers=args.workers
+            workers=args.workers,
+            video_jobs=args.video_jobs
         )
     except Exception as e:
         print(f"错误: {e}")
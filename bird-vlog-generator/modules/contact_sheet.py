@@ -0,0 +1,39 @@
+"""联系表模块 - 把多帧缩小后拼成带编号的网格图，供 AI 一次粗筛多帧"""
+
+import cv2
+import numpy as np
+
+
+def build_contact_sheet(image_paths: list[str], grid: int = 3, tile_width: int = 320, quality: int = 80) -> bytes:
+    """按行优先把最多 grid×grid 帧拼成一张网格图，每格左上角标注编号 1..N，返回 JPEG 字节
+    
+    各格高度按第一张可读图片的宽高比确定，其余图片等比缩放后居中（黑边补齐）；
+    无法读取的图片留黑格（编号照常标注）。
+    """
+    images = [cv2.imread(path) for path in image_paths[:grid * grid]]
+    first = next((image for image in images if image is not None), None)
+    aspect = first.shape[0] / first.shape[1] if first is not None else 9 / 16
+    tile_height = max(1, round(tile_width * aspect))
+    
+    rows = (len(images) + grid - 1) // grid
+    sheet = np.zeros((rows * tile_height, grid * tile_width, 3), dtype=np.uint8)
+    font_scale = tile_width / 320
+    thickness = max(1, round(2 * font_scale))
+    
+    for n, image in enumerate(images):
+        top, left = (n // grid) * tile_height, (n % grid) * tile_width
+        if image is not None:
+            scale = min(tile_width / image.shape[1], tile_height / image.shape[0])
+            w, h = max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale))
+            y, x = top + (tile_height - h) // 2, left + (tile_width - w) // 2
+            sheet[y:y + h, x:x + w] = cv2.resize(image, (w, h), interpolation=cv2.INTER_AREA)
+        
+        origin = (left + round(8 * font_scale), top + round(32 * font_scale))
+        label = str(n + 1)
+        cv2.putText(sheet, label, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness + 3, cv2.LINE_AA)
+        cv2.putText(sheet, label, origin, cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 255, 255), thickness, cv2.LINE_AA)
+    
+    ok, encoded = cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("联系表编码失败")
+    return encoded.tobytes()
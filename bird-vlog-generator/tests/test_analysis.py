@@ -0,0 +1,148 @@
+"""AI 分析的测试：相似帧去重、鸟框裁剪、多帧请求与回复解析、粗筛缓存（不调用视觉模型）"""
+
+import functools
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from modules.frame_dedupe import cluster_frames
+
+
+@pytest.fixture
+def frames(tmp_path):
+    """两张几乎相同的画面 + 一张完全不同的画面"""
+    rng = np.random.default_rng(0)
+    base = cv2.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (15, 15), 0)
+    noisy = np.clip(base.astype(np.int16) + rng.integers(-2, 3, base.shape), 0, 255).astype(np.uint8)
+    other = cv2.GaussianBlur(rng.integers(0, 256, (240, 320, 3), dtype=np.uint8), (15, 15), 0)
+    paths = []
+    for name, image in (("a", base), ("b", noisy), ("c", other)):
+        path = str(tmp_path / f"{name}.jpg")
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def test_cluster_frames_merges_near_duplicates(frames):
+    assert cluster_frames(frames, max_distance=4) == [0, 0, 2]
+
+
+def test_cluster_frames_respects_groups(frames):
+    assert cluster_frames(frames, max_distance=4, groups=[1, 2, 1]) == [0, 1, 2]
+
+
+def test_cluster_frames_unreadable_images_stay_alone(frames, tmp_path):
+    missing = str(tmp_path / "missing.jpg")
+    assert cluster_frames([missing, missing, frames[0]]) == [0, 1, 2]
+
+
+@pytest.fixture
+def analyzer():
+    pytest.importorskip("openai")
+    from modules import bedrock_analyzer
+    return bedrock_analyzer
+
+
+def test_roi_window_pads_and_enforces_min_side(analyzer):
+    window = analyzer.roi_window([{"box": [900, 500, 1000, 580]}], 1920, 1080, padding=0.5, min_side=384)
+    x1, y1, x2, y2 = window
+    assert (x2 - x1, y2 - y1) == (384, 384)
+    assert x1 <= 850 and x2 >= 1050 and y1 <= 460 and y2 >= 620
+
+
+def test_roi_window_stays_inside_frame(analyzer):
+    x1, y1, x2, y2 = analyzer.roi_window([{"box": [1900, 1040, 1920, 1080]}], 1920, 1080, padding=0.5, min_side=384)
+    assert (x1, y1, x2, y2) == (1536, 696, 1920, 1080)
+
+
+def test_roi_window_skips_large_or_missing_boxes(analyzer):
+    assert analyzer.roi_window([], 1920, 1080) is None
+    assert analyzer.roi_window([{"box": [0, 0, 1800, 1000]}], 1920, 1080) is None
+
+
+def test_parse_multi_analysis_orders_by_index(analyzer):
+    text = '```json\n[{"index": 2, "has_bird": false}, {"index": 1, "has_bird": true}]\n```'
+    assert analyzer._parse_multi_analysis(text, 2) == [{"has_bird": True}, {"has_bird": False}]
+
+
+@pytest.mark.parametrize("text", [
+    '[{"index": 1}]',
+    '[{"index": 1}, {"index": 1}]',
+    '{"index": 1}',
+    '[1, 2]',
+])
+def test_parse_multi_analysis_rejects_mismatched_replies(analyzer, text):
+    with pytest.raises(ValueError):
+        analyzer._parse_multi_analysis(text, 2)
+
+
+@pytest.fixture
+def isolated_cache(analyzer, tmp_path, monkeypatch):
+    """分析缓存写到临时目录，关闭相似帧去重"""
+    from modules import analysis_cache
+    
+    cache_path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(analysis_cache, "load", functools.partial(analysis_cache.load, cache_path=cache_path))
+    monkeypatch.setattr(analysis_cache, "store", functools.partial(analysis_cache.store, cache_path=cache_path))
+    monkeypatch.setattr(analyzer, "ANALYSIS_DEDUPE", False)
+    return cache_path
+
+
+def test_triage_verdicts_are_cached_separately(analyzer, isolated_cache, frames, monkeypatch):
+    """低分帧的粗筛结果也要缓存：重跑不再拼联系表；关闭粗筛后不能把粗筛结果当完整分析"""
+    sheets, analyzed = [], []
+    
+    def fake_triage(paths):
+        sheets.append(paths)
+        return [{"has_bird": False, "highlight_score": 1} for _ in paths]
+    
+    def fake_analyze(path, prompt=None, boxes=None):
+        analyzed.append(path)
+        return '{"has_bird": true, "highlight_score": 8}'
+    
+    monkeypatch.setattr(analyzer, "triage_frames", fake_triage)
+    monkeypatch.setattr(analyzer, "analyze_image", fake_analyze)
+    
+    for _ in range(2):
+        results = analyzer.batch_analyze(frames, max_workers=1, frames_per_request=1, triage=True)
+        assert all(r["triage_only"] for r in results)
+    assert len(sheets) == 1 and not analyzed
+    
+    results = analyzer.batch_analyze(frames, max_workers=1, frames_per_request=1, triage=False)
+    assert sorted(analyzed) == sorted(frames)
+    assert not any(r.get("triage_only") for r in results)
+
+
+@pytest.fixture
+def captured_requests(analyzer, monkeypatch):
+    """截获发给视觉模型的请求 [(图片, 提示词, max_tokens)]，回复按图片数生成"""
+    requests = []
+    
+    def fake_request(images, prompt, max_tokens=1024, detail="auto"):
+        requests.append((images, prompt, max_tokens))
+        return json.dumps([{"index": i, "has_bird": True} for i in range(1, len(images) + 1)])
+    
+    monkeypatch.setattr(analyzer, "_request_analysis", fake_request)
+    monkeypatch.setattr(analyzer, "ANALYSIS_ROI_CROP", False)
+    return requests
+
+
+def test_multi_frame_request_labels_every_image(analyzer, captured_requests, frames):
+    analyzer.analyze_images(frames)
+    images, _, _ = captured_requests[-1]
+    assert [image[2] for image in images] == ["图片 1 整帧：", "图片 2 整帧：", "图片 3 整帧："]
+    
+    analyzer.analyze_images(frames[:1])
+    images, _, _ = captured_requests[-1]
+    assert len(images[0]) == 2  # 单张图不需要编号
+
+
+def test_frames_per_request_fit_the_output_limit(analyzer, isolated_cache, captured_requests, frames, monkeypatch):
+    monkeypatch.setattr(analyzer, "ANALYSIS_MAX_OUTPUT_TOKENS", 2 * analyzer.MAX_TOKENS)
+    
+    results = analyzer.batch_analyze(frames, max_workers=1, frames_per_request=10, triage=False)
+    assert sorted(len(images) for images, _, _ in captured_requests) == [1, 2]
+    assert all(max_tokens <= 2 * analyzer.MAX_TOKENS for _, _, max_tokens in captured_requests)
+    assert all(r["has_bird"] for r in results)